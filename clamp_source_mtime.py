@@ -3,8 +3,8 @@
 When called as a script with arguments, this compiles the directories
 given as arguments recursively.
 
-If upstream is interested, this can be later integrated to the compileall module
-as an additional option (e.g. --clamp-source-mtime).
+The bundled compileall2 module can also clamp the mtimes while compiling,
+see its --clamp-source-mtime option.
 
 License:
 This has been derived from the Python's compileall module
@@ -14,39 +14,11 @@ from __future__ import print_function
 import os
 import sys
 
-# Python 3.6 and higher
-PY36 = sys.version_info[0:2] >= (3, 6)
+from scan_py_sources import scan_dir, source_file
 
 __all__ = ["clamp_dir", "clamp_file"]
 
 
-def _walk_dir(dir, maxlevels, quiet=0):
-    if PY36 and quiet < 2 and isinstance(dir, os.PathLike):
-        dir = os.fspath(dir)
-    else:
-        dir = str(dir)
-    if not quiet:
-        print('Listing {!r}...'.format(dir))
-    try:
-        names = os.listdir(dir)
-    except OSError:
-        if quiet < 2:
-            print("Can't list {!r}".format(dir))
-        names = []
-    names.sort()
-    for name in names:
-        if name == '__pycache__':
-            continue
-        fullname = os.path.join(dir, name)
-        if not os.path.isdir(fullname):
-            yield fullname
-        elif (maxlevels > 0 and name != os.curdir and name != os.pardir and
-              os.path.isdir(fullname) and not os.path.islink(fullname)):
-                for result in _walk_dir(fullname, maxlevels=maxlevels - 1,
-                                        quiet=quiet):
-                    yield result
-
-
 def clamp_dir(dir, source_date_epoch, quiet=0):
     """Clamp the mtime of all modules in the given directory tree.
 
@@ -58,7 +30,7 @@ def clamp_dir(dir, source_date_epoch, quiet=0):
                no output with 2
     """
     maxlevels = sys.getrecursionlimit()
-    files = _walk_dir(dir, quiet=quiet, maxlevels=maxlevels)
+    files = scan_dir(dir, quiet=quiet, maxlevels=maxlevels)
     success = True
     for file in files:
         if not clamp_file(file, source_date_epoch, quiet=quiet):
@@ -71,36 +43,26 @@ def clamp_file(fullname, source_date_epoch, quiet=0):
 
     Arguments:
 
-    fullname:  the file to byte-compile
+    fullname:  the file to clamp, either a path or
+               a SourceFile from scan_py_sources
     source_date_epoch: integer parsed from $SOURCE_DATE_EPOCH
     quiet:     full output with False or 0, errors only with 1,
                no output with 2
     """
-    if PY36 and quiet < 2 and isinstance(fullname, os.PathLike):
-        fullname = os.fspath(fullname)
-    else:
-        fullname = str(fullname)
-    name = os.path.basename(fullname)
-
-    if os.path.isfile(fullname) and not os.path.islink(fullname):
-        if name[-3:] == '.py':
-            try:
-                mtime = int(os.stat(fullname).st_mtime)
-                atime = int(os.stat(fullname).st_atime)
-            except OSError as e:
-                if quiet >= 2:
-                    return False
-                elif quiet:
-                    print('*** Error checking mtime of {!r}...'.format(fullname))
-                else:
-                    print('*** ', end='')
-                print(e.__class__.__name__ + ':', e)
-                return False
+    source = source_file(fullname)
+    fullname = source.path
+
+    if source.is_file() and not source.is_symlink:
+        if source.name[-3:] == '.py':
+            mtime = int(source.st.st_mtime)
+            atime = int(source.st.st_atime)
             if mtime > source_date_epoch:
                 if not quiet:
                     print('Clamping mtime of {!r}'.format(fullname))
                 try:
                     os.utime(fullname, (atime, source_date_epoch))
+                    # Keep the stat data current for the next consumer
+                    source.st = os.stat(fullname)
                 except OSError as e:
                     if quiet >= 2:
                         return False
@@ -17,13 +17,23 @@ and it follows Python licensing. For more info see: https://www.python.org/psf/l
 import os
 import sys
 import importlib.util
+import marshal
 import py_compile
 import struct
 import filecmp
+import threading
+import time
 
-from functools import partial
+from functools import lru_cache, partial
+from itertools import islice
 from pathlib import Path
 
+from clamp_source_mtime import clamp_file
+from pyc_cache import DEFAULT_MAX_SIZE, PycCache, parse_size
+from pyc_journal import PycJournal
+from pyc_normalize import normalize, normalize_file
+from scan_py_sources import scan_dir, source_file
+
 # Python 3.7 and higher
 PY37 = sys.version_info[0:2] >= (3, 7)
 # Python 3.6 and higher
@@ -44,7 +54,14 @@ else:
     pyc_header_lenght = 8
     pyc_header_format = (pyc_struct_format, importlib.util.MAGIC_NUMBER)
 
-__all__ = ["compile_dir","compile_file","compile_path"]
+# CPU time of the current thread, so it is right with the thread backend
+_cpu_time = getattr(time, 'thread_time', time.process_time)
+
+# Kinds of executors compile_dir() and compile_many() can use for workers
+BACKENDS = ('auto', 'process', 'thread', 'interpreter')
+
+__all__ = ["CompileResult", "compile_dir", "compile_file", "compile_many",
+           "compile_path"]
 
 def optimization_kwarg(opt):
     """Returns opt as a dictionary {optimization: opt} for use as **kwarg
@@ -59,35 +76,628 @@ def optimization_kwarg(opt):
         else:
             return dict()
 
-def _walk_dir(dir, maxlevels, quiet=0):
-    if PY36 and quiet < 2 and isinstance(dir, os.PathLike):
-        dir = os.fspath(dir)
+def _default_invalidation_mode():
+    """Returns the invalidation mode py_compile uses when none is given"""
+    if os.environ.get('SOURCE_DATE_EPOCH'):
+        return py_compile.PycInvalidationMode.CHECKED_HASH
+    else:
+        return py_compile.PycInvalidationMode.TIMESTAMP
+
+def _pyc_header(source, source_bytes, invalidation_mode):
+    """Returns the PEP 552 header of the pyc file of source"""
+    header = bytearray(importlib.util.MAGIC_NUMBER)
+    if invalidation_mode == py_compile.PycInvalidationMode.TIMESTAMP:
+        header += struct.pack('<LLL', 0, int(source.st.st_mtime) & 0xFFFF_FFFF,
+                              source.st.st_size & 0xFFFF_FFFF)
     else:
-        dir = str(dir)
-    if not quiet:
-        print('Listing {!r}...'.format(dir))
+        checked = (invalidation_mode ==
+                   py_compile.PycInvalidationMode.CHECKED_HASH)
+        header += struct.pack('<L', 0b1 | checked << 1)
+        header += importlib.util.source_hash(source_bytes)
+    return bytes(header)
+
+@lru_cache(maxsize=64)
+def _listdir(dirname):
+    """Returns the names in dirname, an empty set if it cannot be listed.
+
+    This is cached, so the existence of all the pyc files in one
+    __pycache__ directory is checked with one syscall.
+    compile_many() and compile_file() clear the cache before they start.
+    """
     try:
-        names = os.listdir(dir)
+        return frozenset(os.listdir(dirname))
     except OSError:
-        if quiet < 2:
-            print("Can't list {!r}".format(dir))
-        names = []
-    names.sort()
-    for name in names:
-        if name == '__pycache__':
+        return frozenset()
+
+def _read_pyc_header(cfile):
+    """Returns the first 16 bytes of cfile using as few syscalls as possible"""
+    fd = os.open(cfile, os.O_RDONLY)
+    try:
+        return os.read(fd, 16)
+    finally:
+        os.close(fd)
+
+def _pycs_are_fresh(source, cfiles, invalidation_mode):
+    """Returns True if all the cfiles are up to date with the source.
+
+    Python >= 3.7 only. The pyc files must have been created with the given
+    invalidation mode. Timestamp-based pycs must match the mtime and size
+    of the source, hash-based pycs (checked or unchecked) its hash.
+    The source is only read and hashed once, when all the pyc headers match
+    otherwise. May raise OSError.
+    """
+    if invalidation_mode is None:
+        invalidation_mode = _default_invalidation_mode()
+    cfiles = set(cfiles)
+    for cfile in cfiles:
+        dirname, name = os.path.split(cfile)
+        if name not in _listdir(dirname):
+            return False
+    headers = {_read_pyc_header(cfile) for cfile in cfiles}
+    if invalidation_mode == py_compile.PycInvalidationMode.TIMESTAMP:
+        return headers == {_pyc_header(source, None, invalidation_mode)}
+    checked = invalidation_mode == py_compile.PycInvalidationMode.CHECKED_HASH
+    flags = importlib.util.MAGIC_NUMBER + struct.pack('<L', 0b1 | checked << 1)
+    if len(headers) != 1:
+        return False
+    header = headers.pop()
+    if not header.startswith(flags):
+        return False
+    with open(source.path, 'rb') as f:
+        source_bytes = f.read()
+    return header == _pyc_header(source, source_bytes, invalidation_mode)
+
+def _source_to_bytecode(source, dfile, opt_levels, invalidation_mode,
+                        cache=None, timings=None, source_bytes=None,
+                        reproducible=False):
+    """Byte-compile one source file for multiple optimization levels.
+
+    Python >= 3.7 only. The source is read, stat'ed and (if needed) hashed
+    only once for all the levels. Optimization levels 1 and 2 only strip
+    asserts, ``__debug__`` blocks (both 1 and 2) and docstrings (2 only),
+    so when the source contains no asserts and no ``__debug__``,
+    the code compiled for level 0 is reused for level 1 (and vice versa).
+    If a PycCache is given, the code is taken from it when possible.
+    If a timings dict is given, it is filled with the wall and CPU time
+    spent on each level and with where its code came from
+    ('compiled', 'cache' or 'reused' from another level).
+    source_bytes is the content of the source, if it was already read.
+    With reproducible, the unused FLAG_REF bits are cleared from the code,
+    see pyc_normalize.
+    Returns a dict mapping each level to the content of its pyc file.
+    Compilation errors are raised as py_compile.PyCompileError,
+    the same way py_compile.compile(doraise=True) does it.
+    """
+    fullname = source.path
+    if invalidation_mode is None:
+        invalidation_mode = _default_invalidation_mode()
+    if source_bytes is None:
+        with open(fullname, 'rb') as f:
+            source_bytes = f.read()
+    header = _pyc_header(source, source_bytes, invalidation_mode)
+    # Non-ASCII sources might spell __debug__ in a NFKC-equivalent way
+    debug_sensitive = (not source_bytes.isascii() or
+                       b'assert' in source_bytes or
+                       b'__debug__' in source_bytes)
+
+    bytecodes = {}
+    compiled = {}
+    for opt_level in sorted(opt_levels):
+        effective = sys.flags.optimize if opt_level < 0 else opt_level
+        key = (effective >= 1 if debug_sensitive else None, effective >= 2)
+        if key in compiled:
+            bytecodes[opt_level] = compiled[key]
+            if timings is not None:
+                timings[opt_level] = {'wall': 0.0, 'cpu': 0.0,
+                                      'origin': 'reused'}
+            continue
+        start_wall, start_cpu = time.perf_counter(), _cpu_time()
+        origin = 'cache'
+        data = None
+        if cache is not None:
+            cache_key = cache.key(source_bytes, effective, dfile or fullname,
+                                  invalidation_mode)
+            data = cache.get(cache_key)
+        if data is None:
+            origin = 'compiled'
+            try:
+                code = compile(source_bytes, dfile or fullname, 'exec',
+                               dont_inherit=True, optimize=opt_level)
+            except Exception as err:
+                raise py_compile.PyCompileError(err.__class__, err,
+                                                dfile or fullname)
+            data = marshal.dumps(code)
+            # Drop the code object before compiling the next level, marshal
+            # output depends on reference counts of the marshalled objects
+            del code
+            if reproducible:
+                data = normalize(data)
+            if cache is not None:
+                cache.put(cache_key, data)
+        elif reproducible:
+            # Cached by a run without reproducible
+            data = normalize(data)
+        bytecodes[opt_level] = compiled[key] = header + data
+        if timings is not None:
+            timings[opt_level] = {
+                'wall': time.perf_counter() - start_wall,
+                'cpu': _cpu_time() - start_cpu,
+                'origin': origin,
+            }
+    return bytecodes
+
+def _journal_key(source, dfile, opt_levels, invalidation_mode,
+                 hardlink_dupes, reproducible=False):
+    """Returns (flags, stamp) of a source for PycJournal.
+
+    Python >= 3.7 only. The flags cover everything that affects the pyc
+    files besides the source content, the stamp is the source metadata
+    stored in timestamp-based pyc files.
+    """
+    if invalidation_mode is None:
+        invalidation_mode = _default_invalidation_mode()
+    flags = {
+        'magic': importlib.util.MAGIC_NUMBER.hex(),
+        'optimize': sorted({sys.flags.optimize if opt_level < 0 else opt_level
+                            for opt_level in opt_levels}),
+        'dfile': dfile,
+        'invalidation_mode': invalidation_mode.name,
+        'hardlink_dupes': bool(hardlink_dupes),
+        'reproducible': bool(reproducible),
+    }
+    stamp = None
+    if invalidation_mode == py_compile.PycInvalidationMode.TIMESTAMP:
+        stamp = [int(source.st.st_mtime) & 0xFFFF_FFFF,
+                 source.st.st_size & 0xFFFF_FFFF]
+    return flags, stamp
+
+def _check_cfile(cfile):
+    """Refuse to replace a symlink or a non-regular file like py_compile"""
+    if os.path.islink(cfile):
+        msg = ('{} is a symlink and will be changed into a regular file if '
+               'import writes a byte-compiled file to it')
+        raise FileExistsError(msg.format(cfile))
+    elif os.path.exists(cfile) and not os.path.isfile(cfile):
+        msg = ('{} is a non-regular file and will be changed into a regular '
+               'one if import writes a byte-compiled file to it')
+        raise FileExistsError(msg.format(cfile))
+
+def _write_pyc(cfile, bytecode, source):
+    """Write the content of one pyc file the same way py_compile does"""
+    from importlib import _bootstrap_external
+
+    _check_cfile(cfile)
+    mode = source.st.st_mode | 0o200
+    try:
+        _bootstrap_external._write_atomic(cfile, bytecode, mode)
+    except FileNotFoundError:
+        # The __pycache__ directory is only created when it is missing,
+        # that is once per directory
+        dirname = os.path.dirname(cfile)
+        if not dirname:
+            raise
+        os.makedirs(dirname, exist_ok=True)
+        _bootstrap_external._write_atomic(cfile, bytecode, mode)
+    return cfile
+
+def _link_pyc(existing_cfile, cfile):
+    """Hardlink cfile to an already written pyc file with the same content"""
+    _check_cfile(cfile)
+    try:
+        os.link(existing_cfile, cfile)
+    except FileExistsError:
+        os.unlink(cfile)
+        os.link(existing_cfile, cfile)
+    return cfile
+
+def _write_pycs(opt_cfiles, bytecodes, source, hardlink_dupes):
+    """Write the pyc files for all optimization levels of one source.
+
+    With hardlink_dupes, the content is compared in memory and identical
+    pyc files are written only once and hardlinked right away.
+    Returns (written, linked), the paths of the pyc files written
+    and of the ones that were hardlinked (or are the same file as another
+    written one).
+    """
+    written = []
+    linked = []
+    # The first pyc file written with each content, to hardlink to
+    cfiles_by_bytecode = {}
+    for opt_level in sorted(opt_cfiles):
+        cfile = opt_cfiles[opt_level]
+        bytecode = bytecodes[opt_level]
+        if cfile in written or cfile in linked:
             continue
-        fullname = os.path.join(dir, name)
-        if not os.path.isdir(fullname):
-            yield fullname
-        elif (maxlevels > 0 and name != os.curdir and name != os.pardir and
-              os.path.isdir(fullname) and not os.path.islink(fullname)):
-            yield from _walk_dir(fullname, maxlevels=maxlevels - 1,
-                                 quiet=quiet)
+        existing_cfile = cfiles_by_bytecode.get(bytecode)
+        if hardlink_dupes and existing_cfile is not None:
+            linked.append(_link_pyc(existing_cfile, cfile))
+        else:
+            written.append(_write_pyc(cfile, bytecode, source))
+            cfiles_by_bytecode.setdefault(bytecode, cfile)
+    return written, linked
+
+def _cache_from_source(fullname, opt_level):
+    """Returns the PEP 3147 pyc path of fullname for opt_level"""
+    if opt_level >= 0:
+        opt = opt_level if opt_level >= 1 else ''
+        return importlib.util.cache_from_source(fullname,
+                                                **optimization_kwarg(opt))
+    else:
+        return importlib.util.cache_from_source(fullname)
+
+@lru_cache(maxsize=128)
+def _cfile_template(dirname, opt_level):
+    """Returns (directory, suffix) of pyc files of sources in dirname.
+
+    cache_from_source() is called only once per directory and
+    optimization level, the pyc file of a source named NAME.py is then
+    os.path.join(directory, NAME + suffix).
+    """
+    cfile = _cache_from_source(os.path.join(dirname, '_.py'), opt_level)
+    cdir, cname = os.path.split(cfile)
+    return cdir, cname[1:]
+
+def _cfile(fullname, opt_level):
+    """Same as _cache_from_source(), but cached per directory"""
+    dirname, name = os.path.split(fullname)
+    if name[-3:] != '.py' or name == '.py':
+        return _cache_from_source(fullname, opt_level)
+    cdir, suffix = _cfile_template(dirname, opt_level)
+    return os.path.join(cdir, name[:-3] + suffix)
+
+def _call_chunk(fn, chunk):
+    """Call fn for each item of chunk in a worker, return the results"""
+    return [fn(item) for item in chunk]
+
+def _chunks(items, chunksize):
+    """Yield lists of up to chunksize items from the items iterable"""
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+def _map_bounded(executor, fn, items, workers, chunksize=8):
+    """Like executor.map(fn, items), but with a bounded number of tasks.
+
+    items are consumed lazily and submitted in chunks of chunksize,
+    with at most 4 chunks per worker in flight at once, so a huge
+    iterable is neither consumed nor turned into futures all at once.
+    Results are yielded as soon as they are ready (in completion order).
+    items are consumed in a separate thread, so the results of the
+    submitted chunks are yielded even while the next item is slow to
+    come (e.g. names read from stdin). An exception raised by items
+    is raised once the chunks submitted before it are done.
+    """
+    import queue
+
+    window = 4 * (workers or os.cpu_count() or 1)
+    slots = threading.Semaphore(window)
+    # Finished futures, then (number of submitted chunks, exception)
+    finished = queue.Queue()
+    stop = threading.Event()
+    call_chunk = _shareable(executor, _call_chunk)
+
+    def submit_chunks():
+        submitted = 0
+        error = None
+        try:
+            for chunk in _chunks(items, chunksize):
+                slots.acquire()
+                if stop.is_set():
+                    break
+                future = executor.submit(call_chunk, fn, chunk)
+                submitted += 1
+                future.add_done_callback(finished.put)
+        except BaseException as e:
+            error = e
+        finally:
+            finished.put((submitted, error))
+
+    submitter = threading.Thread(target=submit_chunks, daemon=True)
+    submitter.start()
+    received = 0
+    submitted = error = None
+    try:
+        while submitted is None or received < submitted:
+            item = finished.get()
+            if isinstance(item, tuple):
+                submitted, error = item
+                continue
+            received += 1
+            slots.release()
+            yield from item.result()
+        if error is not None:
+            raise error
+    finally:
+        # Let the submitter stop if the results are no longer wanted
+        stop.set()
+        slots.release()
+
+def _shareable(executor, function):
+    """Returns function in a form the workers of executor can import.
+
+    Subinterpreters of an InterpreterPoolExecutor have their own __main__
+    module, so when this runs as a script, they get the function from
+    the compileall2 module instead.
+    """
+    if __name__ != '__main__':
+        return function
+    try:
+        from concurrent.futures import InterpreterPoolExecutor
+    except ImportError:
+        return function
+    if not isinstance(executor, InterpreterPoolExecutor):
+        return function
+    import compileall2
+    return getattr(compileall2, function.__name__)
+
+def _largest_first(files):
+    """Sort SourceFiles so the biggest sources are compiled first"""
+    return sorted(files, key=lambda source: source.st.st_size if source.st else 0,
+                  reverse=True)
+
+# Modules imported by the workers, preloaded into the forkserver process
+_WORKER_PRELOAD = ['__main__', 'importlib.util', 'marshal', 'py_compile',
+                   'clamp_source_mtime', 'pyc_cache', 'pyc_journal',
+                   'pyc_normalize', 'scan_py_sources']
+
+def _process_pool(workers):
+    """Returns a ProcessPoolExecutor with the given number of workers.
+
+    Returns None when workers is 1 or when this is a system where
+    ProcessPoolExecutor cannot function. If workers is 0, the executor
+    chooses the number of workers. Where possible, the workers are started
+    by a forkserver with the modules they need already imported.
+    """
+    if workers < 0:
+        raise ValueError('workers must be greater or equal to 0')
+    if workers == 1:
+        return None
+    # Check if this is a system where ProcessPoolExecutor can function.
+    from concurrent.futures.process import _check_system_limits
+    try:
+        _check_system_limits()
+    except NotImplementedError:
+        return None
+    from concurrent.futures import ProcessPoolExecutor
+    mp_context_arg = {}
+    if PY37:
+        import multiprocessing
+        if multiprocessing.get_start_method() == 'fork':
+            mp_context = multiprocessing.get_context('forkserver')
+        else:
+            mp_context = multiprocessing.get_context()
+        if mp_context.get_start_method() == 'forkserver':
+            mp_context.set_forkserver_preload(_WORKER_PRELOAD)
+        mp_context_arg = {"mp_context": mp_context}
+    # If workers == 0, let ProcessPoolExecutor choose
+    return ProcessPoolExecutor(max_workers=workers or None, **mp_context_arg)
+
+def _gil_enabled():
+    """Returns False on a free-threaded interpreter running without the GIL"""
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return is_gil_enabled is None or is_gil_enabled()
+
+def _pool(workers, backend='auto'):
+    """Returns an executor with the given number of workers.
+
+    backend is one of BACKENDS: 'process' is a process pool (see
+    _process_pool()), 'thread' is a thread pool, which avoids starting
+    processes and pickling the arguments, but only runs compile()
+    in parallel on free-threaded interpreters. 'interpreter' is a pool
+    of subinterpreters with their own GIL in this process (Python 3.14+).
+    'auto' chooses threads when the GIL is disabled and processes
+    otherwise.
+    Returns None when workers is 1 (or if processes cannot be used).
+    """
+    if backend not in BACKENDS:
+        raise ValueError('backend must be one of {}'.format(', '.join(BACKENDS)))
+    if workers < 0:
+        raise ValueError('workers must be greater or equal to 0')
+    if workers == 1:
+        return None
+    if backend == 'auto':
+        backend = 'process' if _gil_enabled() else 'thread'
+    if backend == 'thread':
+        from concurrent.futures import ThreadPoolExecutor
+        # compile() is CPU bound, more threads than CPUs do not help
+        return ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+    if backend == 'interpreter':
+        try:
+            from concurrent.futures import InterpreterPoolExecutor
+        except ImportError:
+            raise ValueError('the interpreter backend needs Python 3.14+')
+        return InterpreterPoolExecutor(
+            max_workers=workers or os.cpu_count() or 1)
+    return _process_pool(workers)
+
+class CompileResult:
+    """What happened to one file byte-compiled by compile_many()
+
+    path:      path of the source file
+    size:      size of the source file, None if it cannot be stat'ed
+    status:    'compiled', 'up-to-date' (the pyc files were kept),
+               'excluded' (by the arguments, or not a .py file)
+               or 'failed'
+    success:   False if the file failed to compile
+               or its mtime failed to be clamped
+    written:   paths of the written pyc files
+    linked:    paths of the pyc files hardlinked to a written one with
+               the same content (or being the same file as a written one)
+    kept:      paths of the up-to-date pyc files that were kept
+    error:     error message of a failed compilation
+    warnings:  other messages about the file
+    levels:    timings of the optimization levels, a dict with the wall
+               and CPU time and the origin of the code ('compiled',
+               'cache' or 'reused' from another level) for each level
+    wall:      wall time spent on the file
+    cpu:       CPU time spent on the file
+    worker:    id of the worker that handled the file, '<pid>:<thread id>'
+               (the thread and interpreter backends share one process)
+    """
+    __slots__ = ('path', 'size', 'status', 'success', 'written', 'linked',
+                 'kept', 'error', 'warnings', 'levels', 'wall', 'cpu',
+                 'worker')
+
+    def __init__(self, path, size=None):
+        self.path = path
+        self.size = size
+        self.status = 'excluded'
+        self.success = True
+        self.written = []
+        self.linked = []
+        self.kept = []
+        self.error = None
+        self.warnings = []
+        self.levels = {}
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.worker = '{}:{}'.format(os.getpid(), threading.get_ident())
+
+    def __repr__(self):
+        return '<CompileResult {!r} {}>'.format(self.path, self.status)
+
+    def as_dict(self):
+        """Returns the result as a dict that can be serialized to JSON"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+# The results of the directories in the file list are printed from
+# the thread consuming it, see _map_bounded()
+_print_lock = threading.Lock()
+
+def _print_result(result, quiet):
+    """Print the compileall messages about one CompileResult"""
+    if quiet >= 2:
+        return
+    with _print_lock:
+        for warning in result.warnings:
+            print(warning)
+        if not quiet and result.status in ('compiled', 'failed'):
+            print('Compiling {!r}...'.format(result.path))
+        if result.error is not None:
+            if quiet:
+                print('*** Error compiling {!r}...'.format(result.path))
+            else:
+                print('*** ', end='')
+            # escape non-printable characters in msg
+            encoding = sys.stdout.encoding or sys.getdefaultencoding()
+            print(result.error.encode(encoding,
+                                      errors='backslashreplace').decode(encoding))
+
+def _report_results(results, quiet, profile=None):
+    """Print the messages about the CompileResults as they come.
+
+    If profile is a list, the results are appended to it as dicts.
+    Returns True if all the files succeeded.
+    """
+    success = True
+    for result in results:
+        _print_result(result, quiet)
+        if profile is not None:
+            profile.append(result.as_dict())
+        if not result.success:
+            success = False
+    return success
+
+def compile_many(sources, ddir=None, force=False, rx=None, quiet=2,
+                 legacy=False, optimize=-1, invalidation_mode=None,
+                 stripdir=None, prependdir=None, limit_sl_dest=None,
+                 hardlink_dupes=False, source_date_epoch=None, cache=None,
+                 journal=None, workers=1, executor=None, largest_first=False,
+                 chunksize=8, backend='auto', reproducible=False):
+    """Byte-compile many files, yield a CompileResult for each of them.
+
+    Unlike compile_file(), this does not print anything about the files,
+    the results tell what happened to each of them. The results are
+    yielded as soon as they are ready, with parallel workers in the order
+    of completion.
+
+    Arguments (only sources is required):
+
+    sources:   iterable of files to byte-compile, either paths or
+               SourceFiles from scan_py_sources; it is consumed while
+               the already consumed files are being compiled (unless
+               largest_first is set, which needs all of them to sort them)
+    quiet:     only affects the messages about clamping the mtimes,
+               see clamp_source_mtime.clamp_file() (no output by default)
+    workers:   maximum number of parallel workers
+    executor:  concurrent.futures.Executor to compile the files in,
+               instead of creating a new one for the given workers
+    largest_first: with parallel workers, compile the biggest source files
+               first, so they don't end up as the last stragglers
+    chunksize: number of files sent to a parallel worker at once
+    backend:   kind of the parallel workers, one of BACKENDS: 'process',
+               'thread', 'interpreter' (subinterpreters, Python 3.14+)
+               or 'auto' (threads on free-threaded interpreters running
+               without the GIL, processes otherwise)
+
+    The other arguments are the same as for compile_file().
+    """
+    # pyc files might have been created since the last call
+    _listdir.cache_clear()
+    compile_one = partial(_compile_file, ddir=ddir, force=force, rx=rx,
+                          quiet=quiet, legacy=legacy, optimize=optimize,
+                          invalidation_mode=invalidation_mode,
+                          stripdir=stripdir, prependdir=prependdir,
+                          limit_sl_dest=limit_sl_dest,
+                          hardlink_dupes=hardlink_dupes,
+                          source_date_epoch=source_date_epoch,
+                          cache=cache, journal=journal,
+                          reproducible=reproducible)
+    if executor is not None:
+        compile_one = partial(_shareable(executor, _compile_file),
+                              **compile_one.keywords)
+        sources = map(source_file, sources)
+        if largest_first:
+            sources = _largest_first(sources)
+        yield from _map_bounded(executor, compile_one, sources, workers,
+                                chunksize)
+        return
+    executor = _pool(workers, backend)
+    if executor is None:
+        yield from map(compile_one, sources)
+        return
+    with executor:
+        yield from compile_many(sources, ddir, force, rx, quiet, legacy,
+                                optimize, invalidation_mode, stripdir,
+                                prependdir, limit_sl_dest, hardlink_dupes,
+                                source_date_epoch, cache, journal, workers,
+                                executor, largest_first, chunksize, backend,
+                                reproducible)
+
+def _profile_report(records, wall, workers):
+    """Returns the --profile-json report of the given profile records"""
+    compiled = [record for record in records
+                if record['status'] == 'compiled']
+    source_bytes = sum(record['size'] or 0 for record in compiled)
+    summary = {
+        'files': len(records),
+        'compiled': len(compiled),
+        'up_to_date': sum(record['status'] == 'up-to-date'
+                          for record in records),
+        'excluded': sum(record['status'] == 'excluded'
+                        for record in records),
+        'failed': sum(record['status'] == 'failed' for record in records),
+        'deduplicated': sum(bool(record['linked']) for record in records),
+        'source_bytes': source_bytes,
+        'workers': workers,
+        'wall': wall,
+        'cpu': sum(record['cpu'] for record in records),
+        'files_per_second': len(compiled) / wall if wall else None,
+        'bytes_per_second': source_bytes / wall if wall else None,
+    }
+    records = sorted(records, key=lambda record: record['path'])
+    return {'summary': summary, 'files': records}
 
 def compile_dir(dir, maxlevels=None, ddir=None, force=False,
                 rx=None, quiet=0, legacy=False, optimize=-1, workers=1,
                 invalidation_mode=None, stripdir=None,
-                prependdir=None, limit_sl_dest=None, hardlink_dupes=False):
+                prependdir=None, limit_sl_dest=None, hardlink_dupes=False,
+                source_date_epoch=None, largest_first=False, cache=None,
+                executor=None, profile=None, journal=None, backend='auto',
+                reproducible=False):
     """Byte-compile all modules in the given directory tree.
 
     Arguments (only dir is required):
@@ -111,8 +721,20 @@ def compile_dir(dir, maxlevels=None, ddir=None, force=False,
     limit_sl_dest: ignore symlinks if they are pointing outside of
                    the defined path
     hardlink_dupes: hardlink duplicated pyc files
+    source_date_epoch: if not None, clamp the mtime of each source file
+               to this value before compiling it
+    largest_first: with parallel workers, compile the biggest source files
+               first, so they don't end up as the last stragglers
+    cache:     PycCache to take already compiled code from
+    executor:  concurrent.futures.Executor to compile the files in,
+               instead of creating a new one for the given workers
+    profile:   list to append a profile record of each file to
+    journal:   PycJournal to skip the files compiled by a previous run with,
+               even with force
+    backend:   kind of the parallel workers, see compile_many()
+    reproducible: clear the FLAG_REF bits no reference uses from the code,
+               so the pyc files do not depend on reference counts
     """
-    ProcessPoolExecutor = None
     if ddir is not None and (stripdir is not None or prependdir is not None):
         raise ValueError(("Destination dir (ddir) cannot be used "
                           "in combination with stripdir or prependdir"))
@@ -122,62 +744,33 @@ def compile_dir(dir, maxlevels=None, ddir=None, force=False,
         ddir = None
     if workers < 0:
         raise ValueError('workers must be greater or equal to 0')
-    if workers != 1:
-        # Check if this is a system where ProcessPoolExecutor can function.
-        from concurrent.futures.process import _check_system_limits
-        try:
-            _check_system_limits()
-        except NotImplementedError:
-            workers = 1
-        else:
-            from concurrent.futures import ProcessPoolExecutor
     if maxlevels is None:
         maxlevels = sys.getrecursionlimit()
-    files = _walk_dir(dir, quiet=quiet, maxlevels=maxlevels)
-    success = True
-    if workers != 1 and ProcessPoolExecutor is not None:
-        mp_context_arg = {}
-        if PY37:
-            import multiprocessing
-            if multiprocessing.get_start_method() == 'fork':
-                mp_context = multiprocessing.get_context('forkserver')
-            else:
-                mp_context = None
-            mp_context_arg = {"mp_context": mp_context}
-        # If workers == 0, let ProcessPoolExecutor choose
-        workers = workers or None
-        with ProcessPoolExecutor(max_workers=workers,
-                                 **mp_context_arg) as executor:
-            results = executor.map(partial(compile_file,
-                                           ddir=ddir, force=force,
-                                           rx=rx, quiet=quiet,
-                                           legacy=legacy,
-                                           optimize=optimize,
-                                           invalidation_mode=invalidation_mode,
-                                           stripdir=stripdir,
-                                           prependdir=prependdir,
-                                           limit_sl_dest=limit_sl_dest),
-                                   files)
-            success = min(results, default=True)
-    else:
-        for file in files:
-            if not compile_file(file, ddir, force, rx, quiet,
-                                legacy, optimize, invalidation_mode,
-                                stripdir=stripdir, prependdir=prependdir,
-                                limit_sl_dest=limit_sl_dest,
-                                hardlink_dupes=hardlink_dupes):
-                success = False
-    return success
+    files = scan_dir(dir, quiet=quiet, maxlevels=maxlevels)
+    results = compile_many(files, ddir=ddir, force=force, rx=rx, quiet=quiet,
+                           legacy=legacy, optimize=optimize,
+                           invalidation_mode=invalidation_mode,
+                           stripdir=stripdir, prependdir=prependdir,
+                           limit_sl_dest=limit_sl_dest,
+                           hardlink_dupes=hardlink_dupes,
+                           source_date_epoch=source_date_epoch,
+                           cache=cache, journal=journal, workers=workers,
+                           executor=executor, largest_first=largest_first,
+                           backend=backend, reproducible=reproducible)
+    return _report_results(results, quiet, profile)
 
 def compile_file(fullname, ddir=None, force=False, rx=None, quiet=0,
                  legacy=False, optimize=-1,
                  invalidation_mode=None, stripdir=None, prependdir=None,
-                 limit_sl_dest=None, hardlink_dupes=False):
+                 limit_sl_dest=None, hardlink_dupes=False,
+                 source_date_epoch=None, cache=None, journal=None,
+                 reproducible=False):
     """Byte-compile one file.
 
     Arguments (only fullname is required):
 
-    fullname:  the file to byte-compile
+    fullname:  the file to byte-compile, either a path or
+               a SourceFile from scan_py_sources
     ddir:      if given, the directory name compiled in to the
                byte-code file.
     force:     if True, force compilation, even if timestamps are up-to-date
@@ -194,14 +787,60 @@ def compile_file(fullname, ddir=None, force=False, rx=None, quiet=0,
     limit_sl_dest: ignore symlinks if they are pointing outside of
                    the defined path.
     hardlink_dupes: hardlink duplicated pyc files
+    source_date_epoch: if not None, clamp the mtime of the source file
+               to this value before compiling it
+    cache:     PycCache to take already compiled code from
+               (only used with Python >= 3.7)
+    journal:   PycJournal to skip the file with, even with force, when it
+               was compiled by a previous run with the same flags
+               (only used with Python >= 3.7)
+    reproducible: clear the FLAG_REF bits no reference uses from the code,
+               so the pyc files do not depend on reference counts
     """
+    _listdir.cache_clear()
+    result = _compile_file(fullname, ddir, force, rx, quiet, legacy,
+                           optimize, invalidation_mode, stripdir, prependdir,
+                           limit_sl_dest, hardlink_dupes, source_date_epoch,
+                           cache, journal, reproducible)
+    _print_result(result, quiet)
+    return result.success
 
+def _compile_file(fullname, ddir=None, force=False, rx=None, quiet=0,
+                  legacy=False, optimize=-1, invalidation_mode=None,
+                  stripdir=None, prependdir=None, limit_sl_dest=None,
+                  hardlink_dupes=False, source_date_epoch=None, cache=None,
+                  journal=None, reproducible=False):
+    """compile_file() returning a CompileResult instead of printing it"""
+    source = source_file(fullname)
+    result = CompileResult(source.path,
+                           source.st.st_size if source.st else None)
+    start_wall, start_cpu = time.perf_counter(), _cpu_time()
+    try:
+        _compile_source(result, source, ddir, force, rx, quiet, legacy,
+                        optimize, invalidation_mode, stripdir, prependdir,
+                        limit_sl_dest, hardlink_dupes, source_date_epoch,
+                        cache, journal, reproducible)
+    finally:
+        result.wall = time.perf_counter() - start_wall
+        result.cpu = _cpu_time() - start_cpu
+    return result
+
+def _compile_source(result, source, ddir, force, rx, quiet, legacy, optimize,
+                    invalidation_mode, stripdir, prependdir, limit_sl_dest,
+                    hardlink_dupes, source_date_epoch, cache, journal,
+                    reproducible):
+    """Byte-compile the SourceFile, record what happened in result"""
     if ddir is not None and (stripdir is not None or prependdir is not None):
         raise ValueError(("Destination dir (ddir) cannot be used "
                           "in combination with stripdir or prependdir"))
 
-    success = True
-    fullname = os.fspath(fullname)
+    fullname = source.path
+
+    # Clamp before any filtering, so all sources are clamped like with
+    # a separate clamp_source_mtime pass over the same tree
+    if source_date_epoch is not None:
+        if not clamp_file(source, source_date_epoch, quiet=quiet):
+            result.success = False
     stripdir = os.fspath(stripdir) if stripdir is not None else None
     name = os.path.basename(fullname)
 
@@ -217,9 +856,9 @@ def compile_file(fullname, ddir=None, force=False, rx=None, quiet=0,
         stripdir_parts = stripdir.split(os.path.sep)
 
         if stripdir_parts != fullname_parts[:len(stripdir_parts)]:
-            if quiet < 2:
-                print("The stripdir path {!r} is not a valid prefix for "
-                      "source path {!r}; ignoring".format(stripdir, fullname))
+            result.warnings.append(
+                "The stripdir path {!r} is not a valid prefix for "
+                "source path {!r}; ignoring".format(stripdir, fullname))
         else:
             dfile = os.path.join(*fullname_parts[len(stripdir_parts):])
 
@@ -239,34 +878,35 @@ def compile_file(fullname, ddir=None, force=False, rx=None, quiet=0,
     if rx is not None:
         mo = rx.search(fullname)
         if mo:
-            return success
+            return
 
-    if limit_sl_dest is not None and os.path.islink(fullname):
+    if limit_sl_dest is not None and source.is_symlink:
         if Path(limit_sl_dest).resolve() not in Path(fullname).resolve().parents:
-            return success
+            return
 
     opt_cfiles = {}
 
-    if os.path.isfile(fullname):
+    if source.is_file():
         for opt_level in optimize:
             if legacy:
                 opt_cfiles[opt_level] = fullname + 'c'
             else:
-                if opt_level >= 0:
-                    opt = opt_level if opt_level >= 1 else ''
-                    opt_kwarg = optimization_kwarg(opt)
-                    cfile = (importlib.util.cache_from_source(
-                             fullname, **opt_kwarg))
-                    opt_cfiles[opt_level] = cfile
-                else:
-                    cfile = importlib.util.cache_from_source(fullname)
-                    opt_cfiles[opt_level] = cfile
+                opt_cfiles[opt_level] = _cfile(fullname, opt_level)
 
         head, tail = name[:-3], name[-3:]
         if tail == '.py':
-            if not force:
+            if not force and PY37:
                 try:
-                    mtime = int(os.stat(fullname).st_mtime)
+                    if _pycs_are_fresh(source, opt_cfiles.values(),
+                                       invalidation_mode):
+                        result.status = 'up-to-date'
+                        result.kept = sorted(set(opt_cfiles.values()))
+                        return
+                except OSError:
+                    pass
+            elif not force:
+                try:
+                    mtime = int(source.st.st_mtime)
                     expect = struct.pack(*(pyc_header_format + (mtime & 0xFFFF_FFFF,)))
                     for cfile in opt_cfiles.values():
                         with open(cfile, 'rb') as chandle:
@@ -274,64 +914,95 @@ def compile_file(fullname, ddir=None, force=False, rx=None, quiet=0,
                         if expect != actual:
                             break
                     else:
-                        return success
+                        result.status = 'up-to-date'
+                        result.kept = sorted(set(opt_cfiles.values()))
+                        return
                 except OSError:
                     pass
-            if not quiet:
-                print('Compiling {!r}...'.format(fullname))
+            source_bytes = None
+            if journal is not None and PY37:
+                try:
+                    with open(fullname, 'rb') as f:
+                        source_bytes = f.read()
+                except OSError:
+                    pass
+                else:
+                    flags, stamp = _journal_key(source, dfile, optimize,
+                                                invalidation_mode,
+                                                hardlink_dupes, reproducible)
+                    if journal.is_current(fullname, source_bytes, flags,
+                                          opt_cfiles.values(), stamp,
+                                          same_inodes=hardlink_dupes):
+                        result.status = 'up-to-date'
+                        result.kept = sorted(set(opt_cfiles.values()))
+                        return
             try:
-                for index, opt_level in enumerate(sorted(optimize)):
-                    cfile = opt_cfiles[opt_level]
-                    if PY37:
-                        ok = py_compile.compile(fullname, cfile, dfile, True,
-                                                optimize=opt_level,
-                                                invalidation_mode=invalidation_mode)
-                    else:
+                if PY37:
+                    bytecodes = _source_to_bytecode(
+                        source, dfile, optimize, invalidation_mode, cache,
+                        result.levels, source_bytes, reproducible)
+                    result.written, result.linked = _write_pycs(
+                        opt_cfiles, bytecodes, source, hardlink_dupes)
+                    if source_bytes is not None:
+                        outputs = {opt_cfiles[opt_level]: bytecodes[opt_level]
+                                   for opt_level in opt_cfiles}
+                        journal.record(PycJournal.entry(fullname, source_bytes,
+                                                        flags, outputs, stamp))
+                    ok = True
+                else:
+                    for index, opt_level in enumerate(sorted(optimize)):
+                        cfile = opt_cfiles[opt_level]
+                        start_wall = time.perf_counter()
+                        start_cpu = _cpu_time()
                         ok = py_compile.compile(fullname, cfile, dfile, True,
                                                 optimize=opt_level)
+                        if reproducible:
+                            normalize_file(cfile)
+                        result.levels[opt_level] = {
+                            'wall': time.perf_counter() - start_wall,
+                            'cpu': _cpu_time() - start_cpu,
+                            'origin': 'compiled',
+                        }
+                        if cfile not in result.written:
+                            result.written.append(cfile)
 
-                    if index > 0 and hardlink_dupes:
-                        previous_cfile = opt_cfiles[optimize[index - 1]]
-                        if previous_cfile == cfile and optimize[0] not in (1, 2):
-                            # Python 3.4 has only one .pyo file for -O and -OO so
-                            # we hardlink it only if there is a .pyc file
-                            # with the same content
-                            previous_cfile = opt_cfiles[optimize[0]]
-                        if  previous_cfile != cfile and filecmp.cmp(cfile, previous_cfile, shallow=False):
-                            os.unlink(cfile)
-                            os.link(previous_cfile, cfile)
+                        if index > 0 and hardlink_dupes:
+                            previous_cfile = opt_cfiles[optimize[index - 1]]
+                            if previous_cfile == cfile and optimize[0] not in (1, 2):
+                                # Python 3.4 has only one .pyo file for -O and -OO so
+                                # we hardlink it only if there is a .pyc file
+                                # with the same content
+                                previous_cfile = opt_cfiles[optimize[0]]
+                            if  previous_cfile != cfile and filecmp.cmp(cfile, previous_cfile, shallow=False):
+                                os.unlink(cfile)
+                                os.link(previous_cfile, cfile)
+                                result.written.remove(cfile)
+                                result.linked.append(cfile)
 
             except py_compile.PyCompileError as err:
-                success = False
-                if quiet >= 2:
-                    return success
-                elif quiet:
-                    print('*** Error compiling {!r}...'.format(fullname))
-                else:
-                    print('*** ', end='')
-                # escape non-printable characters in msg
-                encoding = sys.stdout.encoding or sys.getdefaultencoding()
-                msg = err.msg.encode(encoding, errors='backslashreplace').decode(encoding)
-                print(msg)
+                result.status = 'failed'
+                result.success = False
+                result.error = err.msg
             except (SyntaxError, UnicodeError, OSError) as e:
-                success = False
-                if quiet >= 2:
-                    return success
-                elif quiet:
-                    print('*** Error compiling {!r}...'.format(fullname))
-                else:
-                    print('*** ', end='')
-                print(e.__class__.__name__ + ':', e)
+                result.status = 'failed'
+                result.success = False
+                result.error = e.__class__.__name__ + ': ' + str(e)
             else:
                 if ok == 0:
-                    success = False
-    return success
+                    result.status = 'failed'
+                    result.success = False
+                else:
+                    result.status = 'compiled'
 
 def compile_path(skip_curdir=1, maxlevels=0, force=False, quiet=0,
                  legacy=False, optimize=-1,
-                 invalidation_mode=None):
+                 invalidation_mode=None, executor=None, profile=None,
+                 journal=None, workers=1, backend='auto', reproducible=False):
     """Byte-compile all module on sys.path.
 
+    The files of all the sys.path entries go through one pipeline,
+    so with parallel workers, the entries are compiled concurrently.
+
     Arguments (all optional):
 
     skip_curdir: if true, skip current directory (default True)
@@ -341,24 +1012,34 @@ def compile_path(skip_curdir=1, maxlevels=0, force=False, quiet=0,
     legacy: as for compile_dir() (default False)
     optimize: as for compile_dir() (default -1)
     invalidation_mode: as for compiler_dir()
+    executor: as for compile_dir() (default None)
+    profile: as for compile_dir() (default None)
+    journal: as for compile_dir() (default None)
+    workers: as for compile_dir() (default 1)
+    backend: as for compile_dir() (default 'auto')
+    reproducible: as for compile_dir() (default False)
     """
-    success = True
-    for dir in sys.path:
-        if (not dir or dir == os.curdir) and skip_curdir:
-            if quiet < 2:
-                print('Skipping current directory')
-        else:
-            success = success and compile_dir(
-                dir,
-                maxlevels,
-                None,
-                force,
-                quiet=quiet,
-                legacy=legacy,
-                optimize=optimize,
-                invalidation_mode=invalidation_mode,
-            )
-    return success
+    if workers < 0:
+        raise ValueError('workers must be greater or equal to 0')
+
+    def files():
+        seen = set()
+        for dir in sys.path:
+            if (not dir or dir == os.curdir) and skip_curdir:
+                if quiet < 2:
+                    print('Skipping current directory')
+            elif dir not in seen:
+                seen.add(dir)
+                yield from scan_dir(dir, quiet=quiet, maxlevels=maxlevels)
+
+    # A failure in one entry does not stop the compilation of the others
+    results = compile_many(files(), force=force, quiet=quiet, legacy=legacy,
+                           optimize=optimize,
+                           invalidation_mode=invalidation_mode,
+                           journal=journal, workers=workers,
+                           executor=executor, backend=backend,
+                           reproducible=reproducible)
+    return _report_results(results, quiet, profile)
 
 
 def main():
@@ -423,6 +1104,48 @@ def main():
     parser.add_argument('--hardlink-dupes', action='store_true',
                         dest='hardlink_dupes',
                         help='Hardlink duplicated pyc files')
+    parser.add_argument('--backend', choices=BACKENDS, default='auto',
+                        help=('kind of the workers used with -j: processes, '
+                              'threads, subinterpreters (Python 3.14+) '
+                              'or auto (the default) to use threads '
+                              'on free-threaded Python builds running '
+                              'without the GIL and processes otherwise'))
+    parser.add_argument('--largest-first', action='store_true',
+                        dest='largest_first',
+                        help=('with -j, compile the biggest source files '
+                              'first to avoid long stragglers'))
+    parser.add_argument('--cache-dir', metavar='DIR', dest='cache_dir',
+                        default=os.environ.get('COMPILEALL2_CACHE_DIR'),
+                        help=('take the compiled code of unchanged sources '
+                              'from a persistent cache in DIR and store '
+                              'newly compiled code there; defaults to '
+                              '$COMPILEALL2_CACHE_DIR (Python 3.7+ only)'))
+    parser.add_argument('--cache-size', metavar='SIZE', dest='cache_size',
+                        default=os.environ.get('COMPILEALL2_CACHE_SIZE',
+                                               DEFAULT_MAX_SIZE),
+                        help=('maximum size of the cache, e.g. 500M or 2G; '
+                              'defaults to $COMPILEALL2_CACHE_SIZE or 1G'))
+    parser.add_argument('--clamp-source-mtime', action='store_true',
+                        dest='clamp_source_mtime',
+                        help=('clamp the mtime of each source file to '
+                              '$SOURCE_DATE_EPOCH before compiling it; '
+                              'does nothing if the environment variable '
+                              'is not set'))
+    parser.add_argument('--journal', metavar='FILE', dest='journal',
+                        help=('skip the files whose sources, flags and pyc '
+                              'files did not change since they were compiled '
+                              'with the journal in FILE, even with -f; '
+                              'the journal is created if needed '
+                              '(Python 3.7+ only)'))
+    parser.add_argument('--reproducible', action='store_true',
+                        help=('clear the FLAG_REF bits that no reference '
+                              'uses from the marshalled code, so the pyc '
+                              'files do not depend on reference counts in '
+                              'the compiling interpreter'))
+    parser.add_argument('--profile-json', metavar='FILE', dest='profile_json',
+                        help=('write a JSON report with the status and '
+                              'compile times of each file and a summary '
+                              'to FILE'))
 
     if PY37:
         invalidation_modes = [mode.name.lower().replace('_', '-')
@@ -461,58 +1184,147 @@ def main():
     ):
         parser.error("-d cannot be used in combination with -s or -p")
 
-    # if flist is provided then load it
+    # if flist is provided then open it, the names are read from it
+    # while the already read files are being compiled
+    flist = None
     if args.flist:
         try:
-            with (sys.stdin if args.flist=='-' else
-                    open(args.flist, encoding="utf-8")) as f:
-                for line in f:
-                    compile_dests.append(line.strip())
+            flist = (sys.stdin if args.flist=='-' else
+                     open(args.flist, encoding="utf-8"))
         except OSError:
             if args.quiet < 2:
                 print("Error reading file list {}".format(args.flist))
             return False
 
+    source_date_epoch = None
+    if args.clamp_source_mtime and os.getenv('SOURCE_DATE_EPOCH'):
+        try:
+            source_date_epoch = int(os.getenv('SOURCE_DATE_EPOCH'))
+        except ValueError:
+            parser.error("$SOURCE_DATE_EPOCH must be an integer")
+
+    cache = None
+    if args.cache_dir:
+        try:
+            cache = PycCache(args.cache_dir,
+                             parse_size(args.cache_size or DEFAULT_MAX_SIZE))
+        except ValueError as e:
+            parser.error(str(e))
+
     if PY37 and args.invalidation_mode:
         ivl_mode = args.invalidation_mode.replace('-', '_').upper()
         invalidation_mode = py_compile.PycInvalidationMode[ivl_mode]
     else:
         invalidation_mode = None
 
+    profile = [] if args.profile_json else None
+    journal = PycJournal(args.journal) if args.journal else None
+    start_wall = time.perf_counter()
+
     success = True
+    executor = None
     try:
-        if compile_dests:
-            for dest in compile_dests:
-                if os.path.isfile(dest):
-                    if not compile_file(dest, args.ddir, args.force, args.rx,
-                                        args.quiet, args.legacy,
-                                        invalidation_mode=invalidation_mode,
-                                        stripdir=args.stripdir,
-                                        prependdir=args.prependdir,
-                                        optimize=args.opt_levels,
-                                        limit_sl_dest=args.limit_sl_dest,
-                                        hardlink_dupes=args.hardlink_dupes):
-                        success = False
-                else:
-                    if not compile_dir(dest, maxlevels, args.ddir,
-                                       args.force, args.rx, args.quiet,
-                                       args.legacy, workers=args.workers,
-                                       invalidation_mode=invalidation_mode,
-                                       stripdir=args.stripdir,
-                                       prependdir=args.prependdir,
-                                       optimize=args.opt_levels,
-                                       limit_sl_dest=args.limit_sl_dest,
-                                       hardlink_dupes=args.hardlink_dupes):
-                        success = False
-            return success
+        # One pool of workers is shared by all the destinations
+        try:
+            executor = _pool(args.workers, args.backend)
+        except ValueError as e:
+            parser.error(str(e))
+        if compile_dests or flist is not None:
+            failures = []
+
+            def destinations():
+                for dest in compile_dests:
+                    yield dest
+                if flist is None:
+                    return
+                try:
+                    for line in flist:
+                        dest = line.strip()
+                        if dest:
+                            yield dest
+                except OSError:
+                    if args.quiet < 2:
+                        print("Error reading file list {}".format(args.flist))
+                    failures.append(args.flist)
+
+            def sources():
+                # Directories are compiled right away (in the shared pool),
+                # files are sent to the pool as soon as they are read
+                for dest in destinations():
+                    source = source_file(dest)
+                    if source.is_file():
+                        yield source
+                    elif not compile_dir(dest, maxlevels, args.ddir,
+                                         args.force, args.rx, args.quiet,
+                                         args.legacy, workers=args.workers,
+                                         invalidation_mode=invalidation_mode,
+                                         stripdir=args.stripdir,
+                                         prependdir=args.prependdir,
+                                         optimize=args.opt_levels,
+                                         limit_sl_dest=args.limit_sl_dest,
+                                         hardlink_dupes=args.hardlink_dupes,
+                                         source_date_epoch=source_date_epoch,
+                                         largest_first=args.largest_first,
+                                         cache=cache, executor=executor,
+                                         profile=profile, journal=journal,
+                                         reproducible=args.reproducible):
+                        failures.append(dest)
+
+            # Names from stdin may come slowly (e.g. from a running find),
+            # so each of them is sent to the workers on its own
+            chunksize = 1 if args.flist == '-' else 8
+            results = compile_many(sources(), ddir=args.ddir,
+                                   force=args.force, rx=args.rx,
+                                   quiet=args.quiet, legacy=args.legacy,
+                                   invalidation_mode=invalidation_mode,
+                                   stripdir=args.stripdir,
+                                   prependdir=args.prependdir,
+                                   optimize=args.opt_levels,
+                                   limit_sl_dest=args.limit_sl_dest,
+                                   hardlink_dupes=args.hardlink_dupes,
+                                   source_date_epoch=source_date_epoch,
+                                   cache=cache, journal=journal,
+                                   workers=args.workers, executor=executor,
+                                   largest_first=args.largest_first,
+                                   chunksize=chunksize,
+                                   reproducible=args.reproducible)
+            if not _report_results(results, args.quiet, profile):
+                success = False
+            if failures:
+                success = False
         else:
-            return compile_path(legacy=args.legacy, force=args.force,
-                                quiet=args.quiet,
-                                invalidation_mode=invalidation_mode)
+            success = compile_path(legacy=args.legacy, force=args.force,
+                                   quiet=args.quiet,
+                                   invalidation_mode=invalidation_mode,
+                                   executor=executor, profile=profile,
+                                   journal=journal, workers=args.workers,
+                                   reproducible=args.reproducible)
+        if profile is not None:
+            import json
+            report = _profile_report(profile, time.perf_counter() - start_wall,
+                                     args.workers)
+            try:
+                with open(args.profile_json, 'w', encoding='utf-8') as f:
+                    json.dump(report, f, indent=1)
+            except OSError as e:
+                if args.quiet < 2:
+                    print("Error writing profile {!r}: {}".format(
+                        args.profile_json, e))
+                success = False
+        return success
     except KeyboardInterrupt:
         if args.quiet < 2:
             print("\n[interrupted]")
         return False
+    finally:
+        if flist is not None and flist is not sys.stdin:
+            flist.close()
+        if executor is not None:
+            executor.shutdown()
+        if cache is not None:
+            cache.evict()
+        if journal is not None:
+            journal.compact()
     return True
 
 
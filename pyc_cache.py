@@ -0,0 +1,151 @@
+"""Module implementing a persistent on-disk cache of compiled bytecode.
+
+The cache is used by compileall2 (see its --cache-dir option) to avoid
+recompiling unchanged sources in repeated builds, similarly to what ccache
+does for C compilers. Each entry holds the marshalled code object of one
+source compiled with one optimization level. The pyc header is not cached,
+it is always created from the current source, so entries can be shared
+regardless of the source mtime.
+
+Entries are keyed by a hash of the source content, the bytecode magic number,
+the interpreter build (patch releases may change the compiler output without
+changing the magic number), the optimization level, the path compiled into
+the bytecode (dfile) and the invalidation mode. The cache size is limited,
+the least recently used entries are removed by evict().
+"""
+import hashlib
+import importlib.util
+import os
+import re
+import sys
+import threading
+
+__all__ = ["PycCache", "parse_size"]
+
+DEFAULT_MAX_SIZE = 1024 ** 3
+
+# sha256 of the payload is stored in front of it to detect damaged entries
+_DIGEST_SIZE = hashlib.sha256().digest_size
+
+_SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_size(size):
+    """Parse a size like 500M or 2G (or plain number of bytes) to bytes"""
+    match = re.fullmatch(r'\s*(\d+)\s*([KMG]?)i?B?\s*', str(size),
+                         re.IGNORECASE)
+    if not match:
+        raise ValueError('Invalid size: {!r}'.format(size))
+    return int(match.group(1)) * _SIZE_UNITS[match.group(2).upper()]
+
+
+class PycCache:
+    """Cache of marshalled code objects in the given directory"""
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = os.fspath(directory)
+        self.max_size = max_size
+
+    def key(self, source_bytes, opt_level, dfile, invalidation_mode):
+        """Returns the cache key of one source compiled with one level.
+
+        opt_level must be the effective level (i.e. not -1),
+        invalidation_mode a py_compile.PycInvalidationMode.
+        """
+        key = hashlib.sha256()
+        for part in (importlib.util.MAGIC_NUMBER,
+                     sys.implementation.cache_tag.encode(),
+                     sys.version.encode(),
+                     str(opt_level).encode(),
+                     os.fsencode(dfile),
+                     invalidation_mode.name.encode(),
+                     hashlib.sha256(source_bytes).digest()):
+            key.update(part)
+            key.update(b'\0')
+        return key.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    def get(self, key):
+        """Returns the cached marshalled code or None on a cache miss"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        digest, payload = data[:_DIGEST_SIZE], data[_DIGEST_SIZE:]
+        if hashlib.sha256(payload).digest() != digest:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            return None
+        try:
+            # Mark the entry as recently used
+            os.utime(path)
+        except OSError:
+            pass
+        return payload
+
+    def put(self, key, payload):
+        """Stores the marshalled code, errors are silently ignored"""
+        path = self._path(key)
+        # Unique for each worker, processes and threads alike
+        tmp_path = '{}.{}.{}.tmp'.format(path, os.getpid(),
+                                         threading.get_ident())
+        data = hashlib.sha256(payload).digest() + payload
+        try:
+            try:
+                f = open(tmp_path, 'wb')
+            except FileNotFoundError:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                f = open(tmp_path, 'wb')
+            with f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def evict(self):
+        """Removes the least recently used entries above the size limit.
+
+        The cache is shrunk to 90 % of its limit, so it is not trimmed
+        again by the next build right away.
+        Returns the number of removed entries.
+        """
+        entries = []
+        total = 0
+        try:
+            subdirs = list(os.scandir(self.directory))
+        except OSError:
+            return 0
+        for subdir in subdirs:
+            if not subdir.is_dir(follow_symlinks=False):
+                continue
+            try:
+                with os.scandir(subdir.path) as it:
+                    for entry in it:
+                        st = entry.stat(follow_symlinks=False)
+                        entries.append((st.st_mtime, st.st_size, entry.path))
+                        total += st.st_size
+            except OSError:
+                continue
+        if total <= self.max_size:
+            return 0
+        removed = 0
+        entries.sort()
+        for _mtime, size, path in entries:
+            if total <= self.max_size * 0.9:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
@@ -0,0 +1,168 @@
+"""Module/script to hardlink identical pyc files of the same module.
+
+This is used by brp-python-hardlink. The pyc files of one module compiled
+with different optimization levels (foo.pyc, foo.pyo, foo.opt-1.pyc and
+foo.opt-2.pyc) are often identical, e.g. when the module has no docstrings
+and no asserts. Such files are replaced by hardlinks to one of them.
+
+With --tree, identical pyc files anywhere below the given directory are
+hardlinked as well, not just those of the same module. Bytecode embeds
+the path of its source, so this only finds true copies, e.g. vendored
+modules compiled with the same path or generated stubs.
+
+Only files of the same size that are not hardlinks of each other yet are
+candidates. Each candidate is read once to compute its digest, and files are
+only compared byte by byte when their digests match.
+"""
+import hashlib
+import os
+import sys
+
+__all__ = ["find_pycs", "sibling_groups", "link_identical", "main"]
+
+# Suffixes of the pyc files of one module, the longest first
+_SUFFIXES = ('.opt-1.pyc', '.opt-2.pyc', '.pyc', '.pyo')
+
+_CHUNK_SIZE = 64 * 1024
+
+
+def find_pycs(directory):
+    """Yield the paths of all pyc and pyo files below directory.
+
+    Symbolic links are skipped, like with find -type f.
+    """
+    for path, _dirs, files in os.walk(directory):
+        for name in files:
+            if name.endswith(('.pyc', '.pyo')):
+                full_path = os.path.join(path, name)
+                if not os.path.islink(full_path):
+                    yield full_path
+
+
+def _module_key(path):
+    for suffix in _SUFFIXES:
+        if path.endswith(suffix):
+            return path[:-len(suffix)]
+    return path
+
+
+def sibling_groups(pycs):
+    """Group the pyc files by module, returns a list of lists of paths"""
+    groups = {}
+    for pyc in pycs:
+        groups.setdefault(_module_key(pyc), []).append(pyc)
+    return [sorted(group) for _key, group in sorted(groups.items())
+            if len(group) > 1]
+
+
+def _digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def _same_content(first, second):
+    with open(first, 'rb') as f1, open(second, 'rb') as f2:
+        while True:
+            chunk1 = f1.read(_CHUNK_SIZE)
+            if chunk1 != f2.read(_CHUNK_SIZE):
+                return False
+            if not chunk1:
+                return True
+
+
+def _link(target, path):
+    """Atomically replace path by a hardlink to target"""
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    os.link(target, tmp_path)
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        os.unlink(tmp_path)
+        raise
+
+
+def link_identical(paths):
+    """Hardlink the files with identical content among paths.
+
+    Returns (linked, saved): the number of paths replaced by a hardlink
+    and the number of bytes no longer taken by separate copies.
+    Files that cannot be read or linked are left alone.
+    """
+    # Paths by size (and device, as hardlinks cannot cross them) and inode
+    candidates = {}
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        inodes = candidates.setdefault((st.st_dev, st.st_size), {})
+        inodes.setdefault(st.st_ino, (st.st_nlink, []))[1].append(path)
+
+    linked = saved = 0
+    for (_dev, size), inodes in candidates.items():
+        if len(inodes) < 2:
+            continue
+        # Each inode is read once, the first path of it stands for all of them
+        by_digest = {}
+        for nlink, inode_paths in inodes.values():
+            try:
+                digest = _digest(inode_paths[0])
+            except OSError:
+                continue
+            by_digest.setdefault(digest, []).append((nlink, inode_paths))
+        for same_digest in by_digest.values():
+            if len(same_digest) < 2:
+                continue
+            _nlink, target_paths = same_digest[0]
+            target = target_paths[0]
+            for nlink, inode_paths in same_digest[1:]:
+                try:
+                    if not _same_content(target, inode_paths[0]):
+                        continue
+                    for path in inode_paths:
+                        _link(target, path)
+                        linked += 1
+                except OSError:
+                    continue
+                # The copy is gone once all its names are links to target
+                if nlink == len(inode_paths):
+                    saved += size
+    return linked, saved
+
+
+def main():
+    """Script main program."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Hardlink identical pyc files of the same module.')
+    parser.add_argument('-q', action='store_true', dest='quiet',
+                        help='do not print the summary')
+    parser.add_argument('--tree', metavar='TREE', action='append',
+                        default=[],
+                        help='also hardlink identical pyc files of different '
+                             'modules below TREE, may be repeated')
+    parser.add_argument('directories', metavar='DIR', nargs='+',
+                        help='directories to search for pyc files')
+    args = parser.parse_args()
+
+    groups = [group for directory in args.directories
+              for group in sibling_groups(find_pycs(directory))]
+    groups.extend(list(find_pycs(tree)) for tree in args.tree)
+    linked = saved = 0
+    for group in groups:
+        group_linked, group_saved = link_identical(group)
+        linked += group_linked
+        saved += group_saved
+    if not args.quiet and linked:
+        print('Hardlinked {} identical pyc files, saved {} bytes'.format(
+            linked, saved))
+    return True
+
+
+if __name__ == '__main__':
+    exit_status = int(not main())
+    sys.exit(exit_status)
@@ -0,0 +1,176 @@
+"""Module implementing a journal of byte-compiled files for incremental rebuilds.
+
+The journal is used by compileall2 (see its --journal option) to skip files
+that were already compiled by a previous run with the same flags, even when
+recompilation is forced. This is useful for repeated short-circuit builds,
+where the source mtimes are clamped and the pyc headers cannot tell whether
+a pyc file is up to date.
+
+Each entry of the journal maps a source file to the hash of its content,
+the flags it was compiled with and the hashes of the resulting pyc files.
+A file is skipped when its entry still matches and all its pyc files still
+exist with the recorded content.
+
+The journal is a file with one JSON entry per line. Entries are appended
+by record() (from parallel workers as well), the last entry of a source
+wins. compact() rewrites the file with only the current entries.
+"""
+import hashlib
+import json
+import os
+import threading
+
+__all__ = ["PycJournal"]
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+# Journals unpickled in this process, so a worker process loads each
+# journal only once and not for every task it gets
+_unpickled = {}
+
+
+def _unpickle(path):
+    journal = _unpickled.get(path)
+    if journal is None:
+        journal = _unpickled[path] = PycJournal(path)
+    return journal
+
+
+class PycJournal:
+    """Journal of compiled files stored in the given file"""
+
+    def __init__(self, path):
+        self.path = os.fspath(path)
+        self._entries = None
+        self._fd = None
+        # Workers may be threads sharing this instance
+        self._lock = threading.Lock()
+
+    # The journal is sent to worker processes, each of them loads the
+    # entries and opens the file for appending on its own
+    def __reduce__(self):
+        return (_unpickle, (self.path,))
+
+    def _load(self):
+        entries = {}
+        try:
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line.decode('utf-8'))
+                        entries[entry['source']] = entry
+                    except (ValueError, TypeError, KeyError):
+                        # A line damaged by an interrupted run
+                        continue
+        except OSError:
+            pass
+        return entries
+
+    @property
+    def entries(self):
+        """Dict mapping source paths to their current entries"""
+        if self._entries is None:
+            with self._lock:
+                if self._entries is None:
+                    self._entries = self._load()
+        return self._entries
+
+    @staticmethod
+    def entry(source, source_bytes, flags, outputs, stamp=None):
+        """Returns a new journal entry.
+
+        source:       path of the source file
+        source_bytes: content of the source file
+        flags:        JSON compatible value of everything else that affects
+                      the pyc files (magic number, levels, dfile, ...)
+        outputs:      dict mapping the pyc paths to their content
+        stamp:        JSON compatible value of the source metadata stored
+                      in the pyc files (e.g. mtime and size), if any
+        """
+        return {
+            'source': source,
+            'source_hash': _digest(source_bytes),
+            'flags': flags,
+            'stamp': stamp,
+            'outputs': {cfile: _digest(data)
+                        for cfile, data in outputs.items()},
+        }
+
+    def is_current(self, source, source_bytes, flags, cfiles, stamp=None,
+                   same_inodes=False):
+        """Returns True if the journal entry of source still matches.
+
+        The source content, flags and stamp must be the recorded ones,
+        the pyc files must be the given cfiles and all of them must exist
+        with the recorded content. With same_inodes, pyc files with the same content
+        must also be hardlinks of each other.
+        """
+        entry = self.entries.get(source)
+        if (entry is None or entry['flags'] != flags or
+                entry['stamp'] != stamp or
+                set(entry['outputs']) != set(cfiles) or
+                entry['source_hash'] != _digest(source_bytes)):
+            return False
+        inodes = {}
+        for cfile, digest in entry['outputs'].items():
+            try:
+                st = os.stat(cfile)
+            except OSError:
+                return False
+            inode = (st.st_dev, st.st_ino)
+            known_digest = inodes.get(inode)
+            if known_digest is None:
+                try:
+                    with open(cfile, 'rb') as f:
+                        known_digest = inodes[inode] = _digest(f.read())
+                except OSError:
+                    return False
+            if known_digest != digest:
+                return False
+        # All the contents match, so there are more inodes than distinct
+        # contents only when some duplicates are not hardlinked
+        if same_inodes and len(inodes) != len(set(entry['outputs'].values())):
+            return False
+        return True
+
+    def record(self, entry):
+        """Append the entry to the journal, errors are silently ignored"""
+        self.entries[entry['source']] = entry
+        line = (json.dumps(entry, sort_keys=True) + '\n').encode()
+        try:
+            with self._lock:
+                if self._fd is None:
+                    self._fd = os.open(self.path,
+                                       os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                                       0o644)
+            # One write per line, so parallel appends are not interleaved
+            os.write(self._fd, line)
+        except OSError:
+            pass
+
+    def compact(self):
+        """Rewrite the journal with only the current entry of each source"""
+        self.close()
+        entries = self._load()
+        tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for source in sorted(entries):
+                    f.write(json.dumps(entries[source], sort_keys=True))
+                    f.write('\n')
+            os.replace(tmp_path, self.path)
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+        self._entries = entries
+
+    def close(self):
+        """Close the file entries are appended to"""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,285 @@
+"""Module/script to make marshalled code objects reproducible.
+
+When marshal dumps an object that is referenced more than once, it sets
+the FLAG_REF bit on its type code, so later occurrences of the same object
+can be dumped as a reference (TYPE_REF) to it. The reference counts depend
+on the state of the interpreter (e.g. interned strings shared with other
+modules), so the same source may be marshalled with a different set of
+FLAG_REF bits. normalize() clears the FLAG_REF bit of every object that is
+never referenced and renumbers the references to the remaining ones.
+The loaded code object does not change, nor does the size of the data.
+
+This is what marshalparser --fix does, compileall2 uses it to write
+reproducible pyc files right away (see its --reproducible option).
+
+needs_normalization() checks a pyc file without reading it into memory
+(it is memory-mapped), so files that are already reproducible are neither
+copied nor rewritten. Most pyc files in a tree usually are.
+
+The marshal format of Python 3.4 and higher is supported. The layout of
+code objects differs between Python versions, it is chosen by the magic
+number of the pyc file.
+"""
+import importlib.util
+import mmap
+import struct
+import sys
+
+__all__ = ["needs_normalization", "normalize", "normalize_file",
+           "normalize_pyc", "pyc_header_size"]
+
+FLAG_REF = 0x80
+
+TYPE_NULL = ord('0')
+TYPE_REF = ord('r')
+TYPE_CODE = ord('c')
+TYPE_DICT = ord('{')
+
+# Type codes followed by a fixed number of bytes
+_FIXED_SIZES = {code: size for codes, size in (
+    ('0NFTS.', 0),  # NULL, None, False, True, StopIteration, Ellipsis
+    ('i', 4),       # int32
+    ('g', 8),       # binary float
+    ('y', 16),      # binary complex
+) for code in map(ord, codes)}
+# Type codes followed by a size and that many bytes
+_INT_SIZED = frozenset(map(ord, 'stuaA'))  # bytes and str
+_BYTE_SIZED = frozenset(map(ord, 'zZ'))    # short ASCII str
+# Type codes followed by a size and that many objects
+_INT_COUNTED = frozenset(map(ord, '([<>'))  # tuple, list, set, frozenset
+_BYTE_COUNTED = frozenset(map(ord, ')'))    # small tuple
+# Text floats and complex numbers (no longer written since Python 2.7)
+_TEXT_NUMBERS = {ord('f'): 1, ord('x'): 2}
+# Slices (Python 3.14+)
+_SLICE = ord(':')
+
+_int32 = struct.Struct('<i')
+
+
+def _code_layout(magic):
+    """Returns the fields of code objects: 'i' for int32s, 'o' for objects"""
+    if not 3310 <= magic < 10000:
+        # Python 2 magic numbers are higher
+        raise ValueError('unsupported magic number {} (not Python 3.4+)'.format(
+            magic))
+    if magic < 3400:
+        # Python 3.4 - 3.7
+        return 'iiiii' + 'oooooooo' + 'i' + 'o'
+    if magic < 3450:
+        # Python 3.8 - 3.10 have posonlyargcount
+        return 'iiiiii' + 'oooooooo' + 'i' + 'o'
+    # Python 3.11+ have localsplus, qualname and exceptiontable
+    return 'iiiii' + 'oooooooo' + 'i' + 'oo'
+
+
+def _magic_number(magic):
+    """Returns the magic number of the magic bytes of a pyc file"""
+    if len(magic) < 4:
+        raise ValueError('truncated pyc header')
+    return magic[0] | magic[1] << 8
+
+
+def pyc_header_size(magic):
+    """Returns the size of the pyc header for the magic bytes"""
+    number = _magic_number(magic)
+    if number >= 3392:
+        # Python 3.7+ have the flags field
+        return 16
+    return 12
+
+
+def _scan(data, start, layout):
+    """Find the FLAG_REF type codes and the references in data.
+
+    Returns (flagged, refs): the offsets of the flagged type codes in the
+    order of their reference indexes (pre-order, the order marshal
+    assigns them in) and a list of (offset of the index, index) of each
+    reference.
+    """
+    flagged = []
+    refs = []
+    unpack_int = _int32.unpack_from
+
+    def read_object(pos):
+        code = data[pos]
+        if code & FLAG_REF:
+            flagged.append(pos)
+            code &= ~FLAG_REF
+        pos += 1
+        size = _FIXED_SIZES.get(code)
+        if size is not None:
+            return pos + size
+        if code in _INT_SIZED:
+            return pos + 4 + unpack_int(data, pos)[0]
+        if code in _BYTE_SIZED:
+            return pos + 1 + data[pos]
+        if code == TYPE_REF:
+            index = unpack_int(data, pos)[0]
+            if not 0 <= index < len(flagged):
+                raise ValueError('invalid reference at {}'.format(pos))
+            refs.append((pos, index))
+            return pos + 4
+        if code in _INT_COUNTED or code in _BYTE_COUNTED:
+            if code in _BYTE_COUNTED:
+                count = data[pos]
+                pos += 1
+            else:
+                count = unpack_int(data, pos)[0]
+                pos += 4
+            for _ in range(count):
+                pos = read_object(pos)
+            return pos
+        if code == TYPE_DICT:
+            while data[pos] != TYPE_NULL:
+                pos = read_object(read_object(pos))
+            return pos + 1
+        if code == TYPE_CODE:
+            for field in layout:
+                if field == 'i':
+                    pos += 4
+                else:
+                    pos = read_object(pos)
+            return pos
+        if code == ord('l'):
+            # Long integer, 15-bit digits stored in 2 bytes each
+            return pos + 4 + 2 * abs(unpack_int(data, pos)[0])
+        if code in _TEXT_NUMBERS:
+            for _ in range(_TEXT_NUMBERS[code]):
+                pos += 1 + data[pos]
+            return pos
+        if code == _SLICE:
+            for _ in range(3):
+                pos = read_object(pos)
+            return pos
+        raise ValueError('unknown type code {!r} at {}'.format(
+            chr(code), pos - 1))
+
+    try:
+        end = read_object(start)
+    except (IndexError, struct.error):
+        raise ValueError('truncated marshal data')
+    if end > len(data):
+        raise ValueError('truncated marshal data')
+    return flagged, refs
+
+
+def _unused(flagged, refs):
+    used = set(index for _pos, index in refs)
+    if len(used) == len(flagged):
+        return []
+    return [index for index in range(len(flagged)) if index not in used]
+
+
+def normalize(data, magic=importlib.util.MAGIC_NUMBER, start=0):
+    """Returns data with the unused FLAG_REF bits cleared.
+
+    data is the marshalled code object (starting at the offset start,
+    e.g. after a pyc header), magic the magic bytes of the Python
+    that marshalled it. data is returned as is when nothing changes.
+    Raises ValueError if data is not a valid marshal stream.
+    """
+    layout = _code_layout(_magic_number(magic))
+    flagged, refs = _scan(data, start, layout)
+    unused = _unused(flagged, refs)
+    if not unused:
+        return data
+    result = bytearray(data)
+    for index in unused:
+        result[flagged[index]] &= ~FLAG_REF
+    # The references are renumbered as if the unused indexes never existed
+    unused = set(unused)
+    new_index = 0
+    new_indexes = []
+    for index in range(len(flagged)):
+        new_indexes.append(new_index)
+        if index not in unused:
+            new_index += 1
+    for pos, index in refs:
+        _int32.pack_into(result, pos, new_indexes[index])
+    return bytes(result)
+
+
+def normalize_pyc(data):
+    """Returns the content of a pyc file with the unused FLAG_REF bits cleared"""
+    return normalize(data, data[:4], pyc_header_size(data[:4]))
+
+
+def needs_normalization(path):
+    """Returns True if the pyc file has unused FLAG_REF bits.
+
+    The file is memory-mapped rather than read.
+    Raises ValueError if it is not a valid pyc file.
+    """
+    with open(path, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            raise ValueError('truncated marshal data')
+        with data:
+            magic = data[:4]
+            layout = _code_layout(_magic_number(magic))
+            flagged, refs = _scan(data, pyc_header_size(magic), layout)
+            return bool(_unused(flagged, refs))
+
+
+def normalize_file(path):
+    """Normalize the pyc file in place, returns True if it was changed.
+
+    The file is rewritten in place (the size does not change),
+    so its hardlinks keep sharing its content.
+    Files that need no normalization are not opened for writing.
+    """
+    if not needs_normalization(path):
+        return False
+    with open(path, 'r+b') as f:
+        data = f.read()
+        normalized = normalize_pyc(data)
+        if normalized is data:
+            return False
+        f.seek(0)
+        f.write(normalized)
+    return True
+
+
+def main():
+    """Script main program."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Clear unused FLAG_REF bits in pyc files in place.')
+    parser.add_argument('-q', action='store_true', dest='quiet',
+                        help='do not print the normalized files')
+    parser.add_argument('--check', action='store_true',
+                        help='only print the files that need to be '
+                             'normalized, separated by NUL characters '
+                             '(for xargs -0)')
+    parser.add_argument('pycs', metavar='FILE', nargs='+',
+                        help='pyc files to normalize')
+    args = parser.parse_args()
+
+    success = True
+    if args.check:
+        for pyc in args.pycs:
+            try:
+                if needs_normalization(pyc):
+                    sys.stdout.write(pyc + '\0')
+            except (OSError, ValueError) as e:
+                print('Error checking {!r}: {}'.format(pyc, e),
+                      file=sys.stderr)
+                success = False
+        return success
+
+    for pyc in args.pycs:
+        try:
+            if normalize_file(pyc) and not args.quiet:
+                print('Normalized {!r}'.format(pyc))
+        except (OSError, ValueError) as e:
+            print('Error normalizing {!r}: {}'.format(pyc, e))
+            success = False
+    return success
+
+
+if __name__ == '__main__':
+    exit_status = int(not main())
+    sys.exit(exit_status)
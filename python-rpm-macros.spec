@@ -20,6 +20,12 @@ Source302:      import_all_modules.py
 %global pathfix_version 1.0.0
 Source303:      https://github.com/fedora-python/pathfix/raw/v%{pathfix_version}/pathfix.py
 Source304:      clamp_source_mtime.py
+Source305:      scan_py_sources.py
+Source306:      pyc_cache.py
+Source307:      pyc_journal.py
+Source308:      python_install_post.py
+Source309:      pyc_hardlink.py
+Source310:      pyc_normalize.py
 
 # BRP scripts
 # This one is from redhat-rpm-config < 190
@@ -36,12 +42,16 @@ Source402:      brp-python-hardlink
 Source403:      brp-fix-pyc-reproducibility
 # brp script to write "rpm" string into the .dist-info/INSTALLER file
 Source404:      brp-python-rpm-in-distinfo
+# Cache of interpreter metadata for brp-python-bytecompile and %%py_byte_compile
+Source405:      python-probe
+# Discovery of the Python libdirs in the buildroot shared by the BRP scripts
+Source406:      python-libdirs
 
 # macros and lua: MIT
-# import_all_modules.py: MIT
-# compileall2.py, clamp_source_mtime.py: PSF-2.0
+# import_all_modules.py, pyc_cache.py, pyc_journal.py, python_install_post.py, pyc_hardlink.py, pyc_normalize.py: MIT
+# compileall2.py, clamp_source_mtime.py, scan_py_sources.py: PSF-2.0
 # pathfix.py: PSF-2.0
-# brp scripts: GPL-2.0-or-later
+# brp scripts, python-probe, python-libdirs: GPL-2.0-or-later
 License:        MIT AND PSF-2.0 AND GPL-2.0-or-later
 
 # The package version MUST be always the same as %%{__default_python3_version}.
@@ -123,9 +133,17 @@ install -p -m 644 -t %{buildroot}%{_rpmluadir}/fedora/srpm python.lua
 mkdir -p %{buildroot}%{_rpmconfigdir}/redhat
 install -m 644 compileall2.py %{buildroot}%{_rpmconfigdir}/redhat/
 install -m 644 clamp_source_mtime.py %{buildroot}%{_rpmconfigdir}/redhat/
+install -m 644 scan_py_sources.py %{buildroot}%{_rpmconfigdir}/redhat/
+install -m 644 pyc_cache.py %{buildroot}%{_rpmconfigdir}/redhat/
+install -m 644 pyc_journal.py %{buildroot}%{_rpmconfigdir}/redhat/
+install -m 644 python_install_post.py %{buildroot}%{_rpmconfigdir}/redhat/
+install -m 644 pyc_hardlink.py %{buildroot}%{_rpmconfigdir}/redhat/
+install -m 644 pyc_normalize.py %{buildroot}%{_rpmconfigdir}/redhat/
 install -m 644 import_all_modules.py %{buildroot}%{_rpmconfigdir}/redhat/
 install -m 644 pathfix.py %{buildroot}%{_rpmconfigdir}/redhat/
 install -m 755 brp-* %{buildroot}%{_rpmconfigdir}/redhat/
+install -m 755 python-probe %{buildroot}%{_rpmconfigdir}/redhat/
+install -m 755 python-libdirs %{buildroot}%{_rpmconfigdir}/redhat/
 
 
 # We define our own BRPs here to use the ones from the %%{buildroot},
@@ -138,6 +156,7 @@ install -m 755 brp-* %{buildroot}%{_rpmconfigdir}/redhat/
 %global __brp_python_hardlink %{add_buildroot __brp_python_hardlink}
 %global __brp_fix_pyc_reproducibility %{add_buildroot __brp_fix_pyc_reproducibility}
 %global __brp_python_rpm_in_distinfo %{add_buildroot __brp_python_rpm_in_distinfo}
+%global __python_install_post %{add_buildroot __python_install_post}
 
 # Bake in the version-release and purl namespace of this tool for %%python_wheel_inject_sbom.
 # That way, even when this is installed on a different distro, the purl will still be applicable.
@@ -170,10 +189,18 @@ grep -iF PLACEHOLDER %{buildroot}%{rpmmacrodir}/macros.* && exit 1 || true
 %{rpmmacrodir}/macros.python-srpm
 %{_rpmconfigdir}/redhat/compileall2.py
 %{_rpmconfigdir}/redhat/clamp_source_mtime.py
+%{_rpmconfigdir}/redhat/scan_py_sources.py
+%{_rpmconfigdir}/redhat/pyc_cache.py
+%{_rpmconfigdir}/redhat/pyc_journal.py
+%{_rpmconfigdir}/redhat/python_install_post.py
+%{_rpmconfigdir}/redhat/pyc_hardlink.py
+%{_rpmconfigdir}/redhat/pyc_normalize.py
 %{_rpmconfigdir}/redhat/brp-python-bytecompile
 %{_rpmconfigdir}/redhat/brp-python-hardlink
 %{_rpmconfigdir}/redhat/brp-fix-pyc-reproducibility
 %{_rpmconfigdir}/redhat/brp-python-rpm-in-distinfo
+%{_rpmconfigdir}/redhat/python-probe
+%{_rpmconfigdir}/redhat/python-libdirs
 %{_rpmluadir}/fedora/srpm/python.lua
 
 %files -n python3-rpm-macros
@@ -0,0 +1,381 @@
+"""Module/script running all the stages of %__os_install_post_python at once.
+
+The BRP scripts of %__os_install_post_python (brp-python-rpm-in-distinfo,
+brp-python-bytecompile, brp-fix-pyc-reproducibility and brp-python-hardlink)
+each walk the buildroot on their own. This runs the same stages, in the same
+order, over a single walk of the buildroot: the walk finds the Python
+libdirs, the .dist-info/INSTALLER files and the pyc files, and the pyc files
+written by the byte-compilation are added to that list in memory (from the
+compileall2 --profile-json reports), so the later stages need no other walk.
+
+The byte-compilation itself still runs the interpreter of each libdir,
+with the same options brp-python-bytecompile uses.
+
+It is used instead of the BRP scripts when %_python_install_post_single_process
+is defined, it needs Python 3.6+ to run.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from pyc_hardlink import link_identical, sibling_groups
+from pyc_normalize import normalize_file
+
+__all__ = ["BuildrootScan", "scan_buildroot", "rpm_in_distinfo",
+           "bytecompile", "fix_pyc_reproducibility", "hardlink"]
+
+# The directory with this module, python-probe and the other BRP helpers
+_HELPERS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Paths relative to the buildroot, as matched by the BRP scripts
+_LIBDIR_RE = re.compile(r'/(usr|app)/lib(64)?/python[0-9]\.[0-9]+')
+_INSTALLER_RE = re.compile(
+    r'/usr/lib(64)?/python3\.[0-9]+/site-packages/[^/]+\.dist-info/INSTALLER')
+
+_EXTRA_DISCONTINUED = (
+    "%_python_bytecompile_extra is discontinued, use %py_byte_compile instead.\n"
+    "See: https://fedoraproject.org/wiki/Changes/No_more_automagic_Python_bytecompilation_phase_3")
+
+# Python 3.3 and lower compile with their own stdlib compileall
+_LEGACY_COMPILE_SCRIPT = '''
+import compileall, sys, os
+
+python_libdir, real_libdir, build_root = sys.argv[1:]
+depth = sys.getrecursionlimit()
+
+class Filter:
+    def search(self, path):
+        ret = not os.path.realpath(path).startswith(build_root)
+        return ret
+
+sys.exit(not compileall.compile_dir(python_libdir, depth, real_libdir, force=1, rx=Filter(), quiet=1))
+'''
+
+
+class BuildrootScan:
+    """Result of a single walk of the buildroot.
+
+    root:       the buildroot
+    libdirs:    sorted list of the Python libdirs ({usr,app}/lib{,64}/pythonX.Y)
+    installers: list of the .dist-info/INSTALLER files of Python 3 libdirs
+    pycs:       set of all the .pyc and .pyo files (not symlinks)
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.libdirs = []
+        self.installers = []
+        self.pycs = set()
+
+    def add_pycs(self, directory):
+        """Add the pyc files below directory, which was not walked before"""
+        for path, _dirs, files in os.walk(directory):
+            for name in files:
+                if name.endswith(('.pyc', '.pyo')):
+                    full_path = os.path.join(path, name)
+                    if not os.path.islink(full_path):
+                        self.pycs.add(full_path)
+
+
+def scan_buildroot(root):
+    """Walk the buildroot once, returns a BuildrootScan"""
+    scan = BuildrootScan(root)
+    prefix_length = len(root.rstrip('/'))
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                    if _LIBDIR_RE.fullmatch(entry.path[prefix_length:]):
+                        scan.libdirs.append(entry.path)
+                elif not entry.is_file(follow_symlinks=False):
+                    continue
+                elif entry.name.endswith(('.pyc', '.pyo')):
+                    scan.pycs.add(entry.path)
+                elif (entry.name == 'INSTALLER' and
+                      _INSTALLER_RE.fullmatch(entry.path[prefix_length:])):
+                    scan.installers.append(entry.path)
+            except OSError:
+                continue
+    scan.libdirs.sort()
+    return scan
+
+
+def rpm_in_distinfo(scan):
+    """Write rpm to the INSTALLER files written by pip, remove their RECORD"""
+    for installer in scan.installers:
+        try:
+            with open(installer, 'rb') as f:
+                if f.read() != b'pip\n':
+                    continue
+            with open(installer, 'w') as f:
+                f.write('rpm\n')
+            os.unlink(os.path.join(os.path.dirname(installer), 'RECORD'))
+        except OSError:
+            continue
+    return True
+
+
+def _libdir_name(scan, python_libdir):
+    # Reports and journals are stored per libdir, e.g. usr_lib64_python3.12.json
+    return os.path.relpath(python_libdir, scan.root).replace('/', '_')
+
+
+def _run(args, output, env=None):
+    """Run args with their output appended to the output list"""
+    process = subprocess.run(args, stdout=subprocess.PIPE,
+                             stderr=subprocess.STDOUT, env=env,
+                             universal_newlines=True)
+    output.append(process.stdout)
+    return process.returncode == 0
+
+
+def _bytecompile_libdir(scan, python_libdir, compileall_flags, output):
+    """Byte-compile one libdir like brp-python-bytecompile does.
+
+    Returns (success, written) where written is the list of the pyc files
+    written into the libdir, or None if they are not known.
+    """
+    root = scan.root
+    python_binary = os.path.basename(python_libdir)
+    output.append('Bytecompiling .py files below {} using {}\n'.format(
+        python_libdir, python_binary))
+    probe = subprocess.run(
+        [os.path.join(_HELPERS_DIR, 'python-probe'), python_binary, 'version'],
+        stdout=subprocess.PIPE, universal_newlines=True)
+    if probe.returncode != 0 or not probe.stdout.strip().isdigit():
+        return False, None
+    python_version = int(probe.stdout)
+    env = dict(os.environ, PYTHONPATH=_HELPERS_DIR)
+
+    if python_version < 34:
+        success = _run([python_binary, '-B', '-m', 'clamp_source_mtime', '-q',
+                        python_libdir], output, env)
+        real_libdir = python_libdir.replace(root, '', 1)
+        for options in [], ['-O']:
+            success = _run([python_binary] + options +
+                           ['-c', _LEGACY_COMPILE_SCRIPT, python_libdir,
+                            real_libdir, root],
+                           output) and success
+        return success, None
+
+    if python_version >= 37:
+        # Force the TIMESTAMP invalidation mode
+        invalidation_option = ['--invalidation-mode=timestamp']
+    else:
+        invalidation_option = []
+    libdir_name = _libdir_name(scan, python_libdir)
+    reproducible_option = []
+    if os.environ.get('PYTHON_BYTECOMPILE_REPRODUCIBLE'):
+        reproducible_option = ['--reproducible']
+    journal_option = []
+    journal_dir = os.environ.get('PYTHON_BYTECOMPILE_JOURNAL_DIR')
+    if journal_dir:
+        os.makedirs(journal_dir, exist_ok=True)
+        journal_option = ['--journal',
+                          os.path.join(journal_dir, libdir_name + '.journal')]
+    # The report lists the written pyc files, it is kept when asked for
+    profile_dir = os.environ.get('PYTHON_BYTECOMPILE_PROFILE_DIR')
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+        profile_path = os.path.join(profile_dir, libdir_name + '.json')
+    else:
+        fd, profile_path = tempfile.mkstemp(prefix='python_install_post-',
+                                            suffix='.json')
+        os.close(fd)
+    try:
+        success = _run(
+            [python_binary, '-B', '-m', 'compileall2'] + compileall_flags +
+            ['-o', '0', '-o', '1', '-q', '-f', '-s', root, '-p', '/',
+             '--hardlink-dupes', '--clamp-source-mtime'] +
+            invalidation_option + ['--profile-json', profile_path] +
+            journal_option + reproducible_option + ['-e', root, python_libdir],
+            output, env)
+        try:
+            with open(profile_path, encoding='utf-8') as f:
+                records = json.load(f)['files']
+        except (OSError, ValueError, KeyError):
+            return success, None
+    finally:
+        if not profile_dir:
+            os.unlink(profile_path)
+    written = []
+    for record in records:
+        written.extend(record['written'])
+        written.extend(record['linked'])
+    return success, written
+
+
+def bytecompile(scan, errors_terminate=True, compileall_flags=()):
+    """Byte-compile all the libdirs like brp-python-bytecompile does.
+
+    The libdirs are compiled concurrently when compileall_flags have -jN,
+    the N workers are split between them. The pyc files written are added
+    to scan.pycs. Returns False if a libdir failed and errors_terminate is set.
+    """
+    compileall_flags = list(compileall_flags)
+    ncpus = 1
+    ncpus_index = None
+    for index, flag in enumerate(compileall_flags):
+        match = re.fullmatch(r'-j([0-9]+)', flag)
+        if match:
+            ncpus_index = index
+            ncpus = int(match.group(1)) or os.cpu_count() or 1
+    jobs = max(min(len(scan.libdirs), ncpus), 1)
+    if ncpus_index is not None:
+        compileall_flags[ncpus_index] = '-j{}'.format(ncpus // jobs)
+
+    failed = threading.Event()
+
+    def compile_libdir(python_libdir):
+        output = []
+        if errors_terminate and failed.is_set():
+            # Do not start any more libdirs after a failure
+            return None, output
+        success, written = _bytecompile_libdir(scan, python_libdir,
+                                               compileall_flags, output)
+        if not success:
+            failed.set()
+        return written, output
+
+    with ThreadPoolExecutor(jobs) as executor:
+        # The output of each libdir is kept together and printed in order
+        for python_libdir, (written, output) in zip(
+                scan.libdirs, executor.map(compile_libdir, scan.libdirs)):
+            sys.stdout.write(''.join(output))
+            if written is None:
+                scan.add_pycs(python_libdir)
+            else:
+                scan.pycs.update(written)
+    sys.stdout.flush()
+    return not (errors_terminate and failed.is_set())
+
+
+def _pycs_below(scan, path):
+    """Returns the pyc files below path"""
+    path = os.path.normpath(path)
+    root = os.path.normpath(scan.root)
+    if path == root or path.startswith(root + '/'):
+        prefix = path.rstrip('/') + '/'
+        return [pyc for pyc in scan.pycs if pyc.startswith(prefix)]
+    # Not in the buildroot, so it was not walked
+    outside = BuildrootScan(path)
+    outside.add_pycs(path)
+    return list(outside.pycs)
+
+
+def fix_pyc_reproducibility(scan, path_to_fix):
+    """Normalize the pyc files below path_to_fix in place, see pyc_normalize"""
+    success = True
+    for pyc in sorted(_pycs_below(scan, path_to_fix)):
+        if not pyc.endswith('.pyc'):
+            continue
+        try:
+            normalize_file(pyc)
+        except (OSError, ValueError) as e:
+            print('Error normalizing {!r}: {}'.format(pyc, e))
+            success = False
+    return success
+
+
+def hardlink(scan, tree=None):
+    """Hardlink identical *.pyc, *.pyo, and *.opt-[12].pyc.
+
+    With tree, all the identical pyc files below it are hardlinked as well.
+    """
+    groups = sibling_groups(scan.pycs)
+    if tree:
+        groups.append(_pycs_below(scan, tree))
+    linked = saved = 0
+    for group in groups:
+        group_linked, group_saved = link_identical(group)
+        linked += group_linked
+        saved += group_saved
+    if linked:
+        print('Hardlinked {} identical pyc files, saved {} bytes'.format(
+            linked, saved))
+    return True
+
+
+def _brp_number(value):
+    """Returns the number brp-python-bytecompile reads as 0"$value".
+
+    The leading 0 makes bash read it as an octal number, like in
+    [[ 0"$value" -ne 0 ]]. Returns None for other values, which are
+    an error there (and make such a test false).
+    """
+    value = value.rstrip()
+    if not re.fullmatch('[0-7]*', value):
+        return None
+    return int('0' + value, 8)
+
+
+def main():
+    """Script main program."""
+    parser = argparse.ArgumentParser(
+        description='Run the stages of %%__os_install_post_python '
+                    'over a single walk of $RPM_BUILD_ROOT.')
+    parser.add_argument('--rpm-in-distinfo', action='store_true',
+                        help='write rpm to the .dist-info/INSTALLER files '
+                             'written by pip')
+    parser.add_argument('--bytecompile', action='store_true',
+                        help='byte-compile the Python libdirs')
+    parser.add_argument('--errors-terminate', default='',
+                        help='fail on byte-compilation errors if set to '
+                             'a non-zero number')
+    parser.add_argument('--extra', default='',
+                        help='value of %%_python_bytecompile_extra, '
+                             'fails if set to 1')
+    parser.add_argument('--compileall-flags', default='',
+                        help='extra flags of compileall2, e.g. -j8')
+    parser.add_argument('--reproducible-pyc-path', metavar='PATH',
+                        help='normalize the pyc files below PATH')
+    parser.add_argument('--hardlink', action='store_true',
+                        help='hardlink identical pyc files')
+    parser.add_argument('--hardlink-tree', metavar='PATH',
+                        help='with --hardlink, hardlink all identical pyc '
+                             'files below PATH')
+    args = parser.parse_args()
+
+    root = os.environ.get('RPM_BUILD_ROOT')
+    # If using normal root, avoid changing anything.
+    if not root or root == '/':
+        return True
+    if args.bytecompile and _brp_number(args.extra) == 1:
+        print(_EXTRA_DISCONTINUED, file=sys.stderr)
+        return False
+
+    scan = scan_buildroot(root)
+    if args.rpm_in_distinfo and not rpm_in_distinfo(scan):
+        return False
+    if args.bytecompile:
+        # Same as in brp-python-bytecompile
+        os.environ['PYTHONHASHSEED'] = '0'
+        errors_terminate = _brp_number(args.errors_terminate) not in (None, 0)
+        if not bytecompile(scan, errors_terminate,
+                           args.compileall_flags.split()):
+            return False
+    if (args.reproducible_pyc_path and
+            not fix_pyc_reproducibility(scan, args.reproducible_pyc_path)):
+        return False
+    if args.hardlink and not hardlink(scan, args.hardlink_tree):
+        return False
+    return True
+
+
+if __name__ == '__main__':
+    exit_status = int(not main())
+    sys.exit(exit_status)
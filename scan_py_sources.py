@@ -0,0 +1,182 @@
+"""Module to find .py files in a directory tree with as few syscalls as possible.
+
+This is shared by compileall2 and clamp_source_mtime. The tree is listed
+with os.scandir (where available), so the file type of most entries is known
+without an extra stat call, and only .py candidates are stat'ed. The stat
+result is handed to the consumer inside a SourceFile, so the consumer does
+not need to stat the same path again.
+
+This module is imported by all supported Python versions, including Python 2.
+
+License:
+This has been derived from the Python's compileall module
+and it follows Python licensing. For more info see: https://www.python.org/psf/license/
+"""
+from __future__ import print_function
+import os
+import stat
+import sys
+
+# Python 3.5 and higher
+PY35 = sys.version_info[0:2] >= (3, 5)
+# Python 3.6 and higher
+PY36 = sys.version_info[0:2] >= (3, 6)
+
+__all__ = ["SourceFile", "scan_dir", "source_file"]
+
+
+class SourceFile(object):
+    """A .py file found by scan_dir() (or created by source_file()).
+
+    path:       the full path of the file
+    name:       the basename of the file
+    st:         os.stat() result of the file (following symlinks),
+                None if the file cannot be stat'ed (e.g. a dangling symlink)
+    is_symlink: True if the path itself is a symbolic link
+    """
+    __slots__ = ('path', 'name', 'st', 'is_symlink')
+
+    def __init__(self, path, name, st, is_symlink):
+        self.path = path
+        self.name = name
+        self.st = st
+        self.is_symlink = is_symlink
+
+    def __fspath__(self):
+        return self.path
+
+    def __str__(self):
+        return self.path
+
+    def __repr__(self):
+        return '<SourceFile {!r}>'.format(self.path)
+
+    # SourceFile instances are sent to worker processes,
+    # __slots__ classes need explicit pickle support in Python 2
+    def __getstate__(self):
+        return (self.path, self.name, self.st, self.is_symlink)
+
+    def __setstate__(self, state):
+        self.path, self.name, self.st, self.is_symlink = state
+
+    def is_file(self):
+        """Return True if the path is a regular file (following symlinks)"""
+        return self.st is not None and stat.S_ISREG(self.st.st_mode)
+
+
+def source_file(path):
+    """Return a SourceFile for the given path.
+
+    If path already is a SourceFile, it is returned unchanged,
+    so consumers can accept both paths and scan_dir() results.
+    """
+    if isinstance(path, SourceFile):
+        return path
+    if PY36 and isinstance(path, os.PathLike):
+        path = os.fspath(path)
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return SourceFile(path, os.path.basename(path), None, False)
+    is_symlink = stat.S_ISLNK(st.st_mode)
+    if is_symlink:
+        try:
+            st = os.stat(path)
+        except OSError:
+            st = None
+    return SourceFile(path, os.path.basename(path), st, is_symlink)
+
+
+class _ListdirEntry(object):
+    """Minimal os.DirEntry replacement for Pythons without os.scandir"""
+    __slots__ = ('name', 'path', '_lstat', '_stat')
+
+    def __init__(self, dir, name):
+        self.name = name
+        self.path = os.path.join(dir, name)
+        self._lstat = None
+        self._stat = None
+
+    def is_symlink(self):
+        if self._lstat is None:
+            self._lstat = os.lstat(self.path)
+        return stat.S_ISLNK(self._lstat.st_mode)
+
+    def stat(self):
+        if self._stat is None:
+            if self.is_symlink():
+                self._stat = os.stat(self.path)
+            else:
+                self._stat = self._lstat
+        return self._stat
+
+    def is_dir(self):
+        try:
+            return stat.S_ISDIR(self.stat().st_mode)
+        except OSError:
+            return False
+
+
+def _list_dir(dir):
+    if PY35:
+        return list(os.scandir(dir))
+    return [_ListdirEntry(dir, name) for name in os.listdir(dir)]
+
+
+def _entry_is_dir(entry):
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+def _make_source_file(entry):
+    try:
+        is_symlink = entry.is_symlink()
+    except OSError:
+        is_symlink = False
+    try:
+        st = entry.stat()
+    except OSError:
+        st = None
+    return SourceFile(entry.path, entry.name, st, is_symlink)
+
+
+def scan_dir(dir, maxlevels, quiet=0):
+    """Yield a SourceFile for each .py file in the given directory tree.
+
+    Entries are yielded in sorted order, __pycache__ directories are skipped
+    and symbolic links to directories are not followed.
+
+    Arguments:
+
+    dir:       the directory to scan
+    maxlevels: maximum recursion level
+    quiet:     full output with False or 0, errors only with 1,
+               no output with 2
+    """
+    if PY36 and isinstance(dir, os.PathLike):
+        dir = os.fspath(dir)
+    else:
+        dir = str(dir)
+    if not quiet:
+        print('Listing {!r}...'.format(dir))
+    try:
+        entries = _list_dir(dir)
+    except OSError:
+        if quiet < 2:
+            print("Can't list {!r}".format(dir))
+        entries = []
+    entries.sort(key=lambda entry: entry.name)
+    for entry in entries:
+        name = entry.name
+        if name == '__pycache__':
+            continue
+        if _entry_is_dir(entry):
+            if (maxlevels > 0 and name != os.curdir and name != os.pardir and
+                    not entry.is_symlink()):
+                for result in scan_dir(entry.path, maxlevels=maxlevels - 1,
+                                       quiet=quiet):
+                    yield result
+        elif name[-3:] == '.py':
+            yield _make_source_file(entry)
@@ -0,0 +1,244 @@
+"""Benchmarks of compileall2 and clamp_source_mtime on synthetic trees.
+
+This is not collected by pytest, run it directly, e.g.:
+
+    PYTHONPATH=. python3 tests/bench_compileall2.py --files 2000 -o results.json
+
+The parallel compilation is also timed with each backend of compile_dir
+(processes, threads and subinterpreters on Python 3.14+), which is best
+compared on large trees, e.g. --files 20000. The backends are timed with
+at least 2 workers, even on a machine with a single CPU.
+
+Every benchmark is repeated on the same generated tree and the results
+are written as JSON. Pass the JSON of a previous run as --compare
+to print the relative change of each benchmark.
+"""
+from compileall2 import BACKENDS, compile_dir, compile_file
+from clamp_source_mtime import clamp_dir
+from scan_py_sources import scan_dir
+
+import argparse
+import concurrent.futures
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+
+FUNCTION_TEMPLATE = '''
+def function_{n}(argument, *args, **kwargs):
+    """Docstring of function {n}.
+
+    It is stripped with -OO.
+    """
+    assert argument is not None, 'argument {n} must be set'
+    result = [item * {n} for item in range(argument) if item % 3]
+    if __debug__:
+        result.append({{'key': {n}, 'args': args, 'kwargs': kwargs}})
+    return sum(result[:-1]) + len(result)
+'''
+
+
+def make_source(rng, size):
+    """Returns Python source code of approximately size bytes"""
+    parts = ['"""Synthetic module."""\nimport os\n']
+    length = len(parts[0])
+    while length < size:
+        part = FUNCTION_TEMPLATE.format(n=rng.randrange(10 ** 6))
+        parts.append(part)
+        length += len(part)
+    return ''.join(parts)
+
+
+def generate_tree(root, files, mean_size, size_sigma, depth, symlink_ratio,
+                  duplicate_ratio, seed):
+    """Generate a tree of .py files in root, return the list of their paths.
+
+    File sizes follow a log-normal distribution with the given mean,
+    files are spread over directories nested up to depth levels.
+    """
+    rng = random.Random(seed)
+    # mu of the log-normal distribution with the requested mean
+    mu = math.log(max(mean_size, 1)) - size_sigma ** 2 / 2
+    paths = []
+    regular = []
+    for i in range(files):
+        level = rng.randint(0, depth)
+        dirs = [f'pkg{rng.randrange(4)}' for _ in range(level)]
+        directory = os.path.join(root, *dirs)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'mod{i}.py')
+        if regular and rng.random() < symlink_ratio:
+            os.symlink(rng.choice(regular), path)
+        elif regular and rng.random() < duplicate_ratio:
+            shutil.copyfile(rng.choice(regular), path)
+            regular.append(path)
+        else:
+            size = int(rng.lognormvariate(mu, size_sigma))
+            with open(path, 'w') as f:
+                f.write(make_source(rng, size))
+            regular.append(path)
+        paths.append(path)
+    return paths
+
+
+def set_mtimes(paths, mtime):
+    for path in paths:
+        if not os.path.islink(path):
+            os.utime(path, (mtime, mtime))
+
+
+def measure(repeat, function, setup=None):
+    """Call function repeat times, returns the wall times of the calls"""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def available_backends():
+    """Backends of compile_dir that work with this Python"""
+    backends = ['process', 'thread']
+    if hasattr(concurrent.futures, 'InterpreterPoolExecutor'):
+        backends.append('interpreter')
+    return backends
+
+
+def benchmarks(root, paths, workers, backends):
+    """Yield (name, function, setup) of all the benchmarks"""
+    future = int(time.time()) + 3600
+
+    for hardlink_dupes in False, True:
+        suffix = '-hardlink-dupes' if hardlink_dupes else ''
+        for jobs in sorted({1, workers}):
+            yield (f'compile_dir-j{jobs}{suffix}',
+                   lambda jobs=jobs, hardlink_dupes=hardlink_dupes: compile_dir(
+                       root, quiet=2, force=True, optimize=[0, 1, 2],
+                       workers=jobs, hardlink_dupes=hardlink_dupes),
+                   None)
+    # With one worker, compile_dir uses no pool at all
+    backend_workers = 2 if workers == 1 else workers
+    for backend in backends:
+        yield (f'compile_dir-j{backend_workers}-{backend}',
+               lambda backend=backend: compile_dir(
+                   root, quiet=2, force=True, optimize=[0, 1, 2],
+                   workers=backend_workers, hardlink_dupes=True,
+                   backend=backend),
+               None)
+    yield ('compile_dir-up-to-date',
+           lambda: compile_dir(root, quiet=2, optimize=[0, 1, 2]),
+           None)
+
+    def compile_files():
+        for path in paths:
+            compile_file(path, quiet=2, force=True, optimize=[0, 1, 2])
+    yield 'compile_file', compile_files, None
+
+    yield ('scan_dir',
+           lambda: list(scan_dir(root, maxlevels=sys.getrecursionlimit(),
+                                 quiet=2)),
+           None)
+    yield ('clamp_dir',
+           lambda: clamp_dir(root, source_date_epoch=future - 7200, quiet=2),
+           lambda: set_mtimes(paths, future))
+
+
+def compare(results, baseline):
+    """Print the relative change of the median times against baseline"""
+    baseline = {result['name']: result for result in baseline['results']}
+    for result in results:
+        old = baseline.get(result['name'])
+        if old is None:
+            print(f"{result['name']:35} {result['median']:9.4f}s")
+            continue
+        change = (result['median'] - old['median']) / old['median'] * 100
+        print(f"{result['name']:35} {result['median']:9.4f}s "
+              f"(was {old['median']:.4f}s, {change:+.1f} %)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--files', type=int, default=1000,
+                        help='number of .py files (default %(default)s)')
+    parser.add_argument('--mean-size', type=int, default=8000,
+                        help='mean size of the files in bytes '
+                             '(default %(default)s)')
+    parser.add_argument('--size-sigma', type=float, default=1.0,
+                        help='sigma of the log-normal distribution of the '
+                             'file sizes (default %(default)s)')
+    parser.add_argument('--depth', type=int, default=3,
+                        help='maximum depth of the tree (default %(default)s)')
+    parser.add_argument('--symlink-ratio', type=float, default=0.05,
+                        help='share of files that are symlinks to other '
+                             'files (default %(default)s)')
+    parser.add_argument('--duplicate-ratio', type=float, default=0.1,
+                        help='share of files that are copies of other files '
+                             '(default %(default)s)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the tree generator (default %(default)s)')
+    parser.add_argument('-j', '--workers', type=int,
+                        default=os.cpu_count() or 1,
+                        help='workers of the parallel benchmarks '
+                             '(default %(default)s)')
+    parser.add_argument('--backend', action='append', dest='backends',
+                        choices=[backend for backend in BACKENDS
+                                 if backend != 'auto'],
+                        help='backend of compile_dir -j to compare, may be '
+                             'repeated (default: all available ones)')
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='repetitions of each benchmark '
+                             '(default %(default)s)')
+    parser.add_argument('-o', '--output', metavar='FILE',
+                        help='write the results as JSON to FILE')
+    parser.add_argument('--compare', metavar='FILE',
+                        help='JSON results of a previous run to compare with')
+    args = parser.parse_args()
+    if args.backends is None:
+        args.backends = available_backends()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='bench_compileall2-') as root:
+        paths = generate_tree(root, args.files, args.mean_size,
+                              args.size_sigma, args.depth, args.symlink_ratio,
+                              args.duplicate_ratio, args.seed)
+        for name, function, setup in benchmarks(root, paths, args.workers,
+                                                 args.backends):
+            times = measure(args.repeat, function, setup)
+            results.append({
+                'name': name,
+                'times': times,
+                'min': min(times),
+                'median': statistics.median(times),
+            })
+            if not args.compare:
+                print(f'{name:35} {min(times):9.4f}s')
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    if args.output:
+        report = {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'parameters': {name: value for name, value in vars(args).items()
+                           if name not in ('output', 'compare')},
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+from pathlib import Path
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+SCRIPT_PATH = Path("/usr/lib/rpm/redhat/brp-python-bytecompile")
+
+
+@pytest.fixture
+def buildroot(tmp_path):
+    """Three libdirs, the first one fails fast, the second one is slow"""
+    bindir = tmp_path / "bin"
+    bindir.mkdir()
+    buildroot = tmp_path / "buildroot"
+    libdirs = [buildroot / "usr" / "lib" / "python3.1",
+               buildroot / "usr" / "lib64" / "python3.2",
+               buildroot / "app" / "lib" / "python3.3"]
+    for libdir, delay in zip(libdirs, (0, 1, 0)):
+        (libdir / "site-packages").mkdir(parents=True)
+        (libdir / "site-packages" / "mod.py").write_text("x = 1\n")
+        # Each libdir is compiled by the Python named after it
+        python = bindir / libdir.name
+        python.write_text("#!/bin/sh\nsleep {}\nexec {} \"$@\"\n".format(
+            delay, sys.executable))
+        python.chmod(0o755)
+    (libdirs[0] / "site-packages" / "broken.py").write_text("def\n")
+    return buildroot, bindir, libdirs
+
+
+def bytecompile(buildroot, bindir, errors_terminate):
+    return subprocess.run(
+        [SCRIPT_PATH, "", errors_terminate, "", "-j2"],
+        env={"PATH": "{}:/usr/bin:/bin".format(bindir),
+             "RPM_BUILD_ROOT": str(buildroot),
+             "PYTHON_PROBE_CACHE_DIR": str(bindir.parent / "probe")},
+        capture_output=True, text=True,
+    )
+
+
+def compiled(libdir):
+    return (libdir / "site-packages" / "__pycache__").is_dir()
+
+
+def test_output_is_ordered_by_libdir(buildroot):
+    buildroot, bindir, libdirs = buildroot
+    result = bytecompile(buildroot, bindir, "0")
+    assert result.returncode == 0
+    headers = [line for line in result.stdout.splitlines()
+               if line.startswith("Bytecompiling")]
+    assert headers == [
+        "Bytecompiling .py files below {} using {}".format(libdir, libdir.name)
+        for libdir in libdirs
+    ]
+    # The error of the first libdir is printed before the second one
+    assert result.stdout.index("broken.py") < result.stdout.index(headers[1])
+    assert all(compiled(libdir) for libdir in libdirs)
+
+
+def test_no_new_libdirs_after_a_failure(buildroot):
+    buildroot, bindir, libdirs = buildroot
+    result = bytecompile(buildroot, bindir, "1")
+    assert result.returncode == 1
+    # The libdirs already running are finished, the third one never starts
+    assert compiled(libdirs[0])
+    assert compiled(libdirs[1])
+    assert not compiled(libdirs[2])
+    assert str(libdirs[2]) not in result.stdout
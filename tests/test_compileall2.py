@@ -0,0 +1,615 @@
+from compileall2 import compile_dir, compile_file, compile_many, _map_bounded
+from pyc_cache import PycCache
+from pyc_journal import PycJournal
+from pyc_normalize import normalize_pyc
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import compileall2
+import concurrent.futures
+import importlib.util
+import json
+import os
+import py_compile
+import re
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def tree(tmp_path):
+    (tmp_path / 'pkg' / 'sub').mkdir(parents=True)
+    (tmp_path / 'pkg' / '__init__.py').write_text('')
+    (tmp_path / 'pkg' / 'mod.py').write_text('"""Docstring."""\nassert True\nx = 1\n')
+    (tmp_path / 'pkg' / 'sub' / 'same.py').write_text('x = 1\n')
+    return tmp_path
+
+
+def pycs(path, opt_levels=(0, 1)):
+    for opt in opt_levels:
+        yield importlib.util.cache_from_source(str(path), optimization=opt or '')
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_clamp_source_mtime(tree, workers):
+    for path in tree.rglob('*.py'):
+        os.utime(path, (2000, 2000))
+    (tree / 'pkg' / 'mod.py').touch()
+    assert compile_dir(tree, quiet=2, optimize=[0, 1], workers=workers,
+                       invalidation_mode=None, source_date_epoch=1000)
+    for path in tree.rglob('*.py'):
+        assert os.stat(path).st_mtime == 1000
+        for pyc in pycs(path):
+            with open(pyc, 'rb') as f:
+                header = f.read(16)
+            assert int.from_bytes(header[8:12], 'little') == 1000
+
+
+def test_clamp_source_mtime_keeps_older_mtime(tree):
+    path = tree / 'pkg' / 'mod.py'
+    os.utime(path, (500, 500))
+    assert compile_file(path, quiet=2, optimize=[0], source_date_epoch=1000)
+    assert os.stat(path).st_mtime == 500
+
+
+@pytest.mark.parametrize('source', [
+    '"""Docstring."""\nassert x\nif __debug__:\n    y = 1\n',
+    'def f(x):\n    return x + 1\n',
+])
+def test_same_as_py_compile(tmp_path, source):
+    # Level 0 code is reused for level 1 when the source has no asserts
+    path = tmp_path / 'mod.py'
+    path.write_text(source)
+    assert compile_file(path, quiet=2, optimize=[0, 1, 2])
+    for opt, pyc in enumerate(pycs(path, [0, 1, 2])):
+        expected = py_compile.compile(str(path),
+                                      cfile=str(tmp_path / f'expected{opt}.pyc'),
+                                      optimize=opt, doraise=True)
+        with open(pyc, 'rb') as f, open(expected, 'rb') as f_expected:
+            assert f.read() == f_expected.read()
+
+
+def inodes(tree, opt_levels=(0, 1, 2)):
+    return {str(path): [os.stat(pyc).st_ino for pyc in pycs(path, opt_levels)]
+            for path in sorted(tree.rglob('*.py'))}
+
+
+@pytest.mark.parametrize('force', [False, True])
+def test_hardlink_dupes(tree, force):
+    for _ in range(2):
+        assert compile_dir(tree, quiet=2, optimize=[0, 1, 2], force=force,
+                           hardlink_dupes=True)
+        result = inodes(tree)
+        # No docstrings, no asserts
+        assert len(set(result[str(tree / 'pkg' / 'sub' / 'same.py')])) == 1
+        assert len(set(result[str(tree / 'pkg' / '__init__.py')])) == 1
+        # An assert and a docstring
+        assert len(set(result[str(tree / 'pkg' / 'mod.py')])) == 3
+
+
+def test_hardlink_dupes_different_content(tree):
+    path = tree / 'pkg' / 'mod.py'
+    assert compile_file(path, quiet=2, optimize=[0, 1], hardlink_dupes=True)
+    pyc0, pyc1 = pycs(path)
+    with open(pyc0, 'rb') as f0, open(pyc1, 'rb') as f1:
+        assert f0.read() != f1.read()
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_reproducible(tree, workers):
+    (tree / 'pkg' / 'mod.py').write_text('import os\n\ndef f(x):\n'
+                                         '    return os.sep + x\n')
+    assert compile_dir(tree, quiet=2, optimize=[0, 1], workers=workers)
+    expected = {}
+    for path in tree.rglob('*.py'):
+        for pyc in pycs(path):
+            with open(pyc, 'rb') as f:
+                expected[pyc] = normalize_pyc(f.read())
+    assert compile_dir(tree, quiet=2, optimize=[0, 1], workers=workers,
+                       force=True, reproducible=True)
+    for pyc, data in expected.items():
+        with open(pyc, 'rb') as f:
+            assert f.read() == data
+
+
+def inode_layout(tree):
+    """For each source, which of its pycs share an inode (e.g. [0, 0, 2])"""
+    return {path: [pyc_inodes.index(inode) for inode in pyc_inodes]
+            for path, pyc_inodes in inodes(tree).items()}
+
+
+def test_hardlink_dupes_parallel_same_as_serial(tmp_path):
+    layouts = []
+    for workers in 1, 2:
+        root = tmp_path / str(workers)
+        for i in range(20):
+            (root / f'pkg{i % 3}').mkdir(parents=True, exist_ok=True)
+            (root / f'pkg{i % 3}' / f'mod{i}.py').write_text(
+                f'"""Module {i}."""\n' * (i % 2) + 'assert x\n' * (i % 5 == 0))
+        assert compile_dir(root, quiet=2, optimize=[0, 1, 2], workers=workers,
+                           hardlink_dupes=True)
+        layouts.append({os.path.relpath(path, root): layout
+                        for path, layout in inode_layout(root).items()})
+    serial, parallel = layouts
+    assert serial == parallel
+    assert {tuple(layout) for layout in serial.values()} == {
+        (0, 0, 0), (0, 0, 2), (0, 1, 1), (0, 1, 2),
+    }
+
+
+def test_map_bounded_consumes_items_lazily():
+    consumed = []
+
+    def items():
+        for i in range(1000):
+            consumed.append(i)
+            yield i
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = _map_bounded(executor, lambda i: i * 2, items(), workers=2,
+                               chunksize=4)
+        first = next(results)
+        # 4 chunks per worker in flight and one more chunk being read
+        assert len(consumed) <= (4 * 2 + 1) * 4
+        assert sorted([first] + list(results)) == [i * 2 for i in range(1000)]
+
+
+def test_map_bounded_yields_before_items_are_used_up():
+    more_items = threading.Event()
+
+    def items():
+        yield 1
+        # The next item only comes after the first result
+        assert more_items.wait(timeout=30)
+        yield 2
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = _map_bounded(executor, lambda i: i * 2, items(), workers=2,
+                               chunksize=1)
+        assert next(results) == 2
+        more_items.set()
+        assert list(results) == [4]
+
+
+def test_largest_first(tree):
+    (tree / 'pkg' / 'big.py').write_text('x = 1\n' * 1000)
+    assert compile_dir(tree, quiet=2, optimize=[0, 1], workers=2,
+                       largest_first=True)
+    for path in tree.rglob('*.py'):
+        for pyc in pycs(path):
+            assert os.path.exists(pyc)
+
+
+def test_cache(tree, tmp_path, monkeypatch):
+    cache = PycCache(tmp_path / 'cache')
+    assert compile_dir(tree / 'pkg', quiet=2, optimize=[0, 1], cache=cache)
+    expected = {}
+    for path in tree.rglob('*.py'):
+        for pyc in pycs(path):
+            with open(pyc, 'rb') as f:
+                expected[pyc] = f.read()
+            os.unlink(pyc)
+
+    def no_compile(*args, **kwargs):
+        raise AssertionError('compile() called despite the cache')
+
+    monkeypatch.setattr(compileall2, 'compile', no_compile, raising=False)
+    assert compile_dir(tree / 'pkg', quiet=2, optimize=[0, 1], cache=cache)
+    for pyc, content in expected.items():
+        with open(pyc, 'rb') as f:
+            assert f.read() == content
+
+
+def test_main_shares_one_pool(tree, monkeypatch):
+    pools = []
+    process_pool = compileall2._process_pool
+
+    def counting_process_pool(workers):
+        pools.append(workers)
+        return process_pool(workers)
+
+    monkeypatch.setattr(compileall2, '_process_pool', counting_process_pool)
+    monkeypatch.setattr('sys.argv', [
+        'compileall2', '-q', '-j', '2', '-o', '0', '-o', '1', '--hardlink-dupes',
+        str(tree / 'pkg' / 'sub'), str(tree / 'pkg' / 'mod.py'),
+        str(tree / 'pkg' / '__init__.py'),
+    ])
+    assert compileall2.main()
+    assert pools == [2]
+    for path in tree.rglob('*.py'):
+        for pyc in pycs(path):
+            assert os.path.exists(pyc)
+
+
+def mtimes(path, opt_levels=(0, 1)):
+    return [os.stat(pyc).st_mtime_ns for pyc in pycs(path, opt_levels)]
+
+
+@pytest.mark.parametrize('mode', ['TIMESTAMP', 'CHECKED_HASH', 'UNCHECKED_HASH'])
+def test_fresh_pycs_are_not_rewritten(tree, mode):
+    invalidation_mode = py_compile.PycInvalidationMode[mode]
+    path = tree / 'pkg' / 'mod.py'
+    os.utime(path, (1000, 1000))
+    assert compile_dir(tree, quiet=2, optimize=[0, 1],
+                       invalidation_mode=invalidation_mode)
+    for pyc in pycs(path):
+        os.utime(pyc, ns=(0, 0))
+    assert compile_dir(tree, quiet=2, optimize=[0, 1],
+                       invalidation_mode=invalidation_mode)
+    assert mtimes(path) == [0, 0]
+
+
+@pytest.mark.parametrize('mode', ['TIMESTAMP', 'CHECKED_HASH'])
+def test_stale_pycs_are_rewritten(tree, mode):
+    invalidation_mode = py_compile.PycInvalidationMode[mode]
+    path = tree / 'pkg' / 'mod.py'
+    os.utime(path, (1000, 1000))
+    assert compile_dir(tree, quiet=2, optimize=[0, 1],
+                       invalidation_mode=invalidation_mode)
+    for pyc in pycs(path):
+        os.utime(pyc, ns=(0, 0))
+    # Same mtime, different size and content
+    path.write_text('x = 2\n')
+    os.utime(path, (1000, 1000))
+    assert compile_dir(tree, quiet=2, optimize=[0, 1],
+                       invalidation_mode=invalidation_mode)
+    assert 0 not in mtimes(path)
+
+
+def test_missing_pyc_is_rewritten(tree):
+    path = tree / 'pkg' / 'mod.py'
+    assert compile_dir(tree, quiet=2, optimize=[0, 1])
+    pyc0, pyc1 = pycs(path)
+    os.unlink(pyc1)
+    assert compile_dir(tree, quiet=2, optimize=[0, 1])
+    assert os.path.exists(pyc1)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_profile_records(tree, workers):
+    (tree / 'pkg' / 'broken.py').write_text('def\n')
+    profile = []
+    assert not compile_dir(tree, quiet=2, optimize=[0, 1, 2], workers=workers,
+                           hardlink_dupes=True, rx=re.compile('same'),
+                           profile=profile)
+    records = {os.path.relpath(record['path'], tree): record
+               for record in profile}
+    assert set(records) == {'pkg/__init__.py', 'pkg/broken.py', 'pkg/mod.py',
+                            'pkg/sub/same.py'}
+    assert records['pkg/sub/same.py']['status'] == 'excluded'
+    assert records['pkg/broken.py']['status'] == 'failed'
+    assert 'SyntaxError' in records['pkg/broken.py']['error']
+    mod = records['pkg/mod.py']
+    assert mod['status'] == 'compiled'
+    assert mod['size'] == os.stat(tree / 'pkg' / 'mod.py').st_size
+    assert sorted(mod['levels']) == [0, 1, 2]
+    assert mod['linked'] == []
+    assert mod['written'] == list(pycs(tree / 'pkg' / 'mod.py', (0, 1, 2)))
+    init = records['pkg/__init__.py']
+    assert init['written'] == list(pycs(tree / 'pkg' / '__init__.py', [0]))
+    assert init['linked'] == list(pycs(tree / 'pkg' / '__init__.py', [1, 2]))
+
+    profile = []
+    assert not compile_dir(tree, quiet=2, optimize=[0, 1, 2], workers=workers,
+                           hardlink_dupes=True, profile=profile)
+    records = {os.path.relpath(record['path'], tree): record
+               for record in profile}
+    assert records['pkg/mod.py']['status'] == 'up-to-date'
+    assert records['pkg/sub/same.py']['status'] == 'compiled'
+
+
+def test_profile_workers(tree, monkeypatch):
+    profile = []
+    assert compile_dir(tree, quiet=2, optimize=[0], profile=profile)
+    assert {record['worker'] for record in profile} == {
+        f'{os.getpid()}:{threading.get_ident()}'}
+
+    # Each of the two threads waits for the other one to start compiling
+    started = set()
+    lock = threading.Lock()
+    both_started = threading.Event()
+    compile_source = compileall2._compile_source
+
+    def compile_source_in_both_threads(*args):
+        with lock:
+            started.add(threading.get_ident())
+            if len(started) == 2:
+                both_started.set()
+        both_started.wait(timeout=30)
+        return compile_source(*args)
+
+    monkeypatch.setattr(compileall2, '_compile_source',
+                        compile_source_in_both_threads)
+    results = list(compile_many(tree.rglob('*.py'), optimize=[0], force=True,
+                                workers=2, chunksize=1, backend='thread'))
+    assert len({result.worker for result in results}) == 2
+    assert {result.worker.split(':')[0] for result in results} == {
+        str(os.getpid())}
+
+
+def test_main_profile_json(tree, tmp_path, monkeypatch):
+    report_path = tmp_path / 'profile.json'
+    monkeypatch.setattr('sys.argv', [
+        'compileall2', '-q', '-o', '0', '-o', '1', '--hardlink-dupes',
+        '--profile-json', str(report_path), str(tree / 'pkg'),
+    ])
+    assert compileall2.main()
+    with open(report_path) as f:
+        report = json.load(f)
+    assert [record['path'] for record in report['files']] == sorted(
+        str(path) for path in tree.rglob('*.py'))
+    summary = report['summary']
+    assert summary['files'] == summary['compiled'] == 3
+    assert summary['failed'] == 0
+    assert summary['source_bytes'] == sum(
+        os.stat(path).st_size for path in tree.rglob('*.py'))
+    assert summary['wall'] > 0
+
+
+def test_journal_skips_unchanged_files_with_force(tree, tmp_path):
+    journal = PycJournal(tmp_path / 'journal')
+    assert compile_dir(tree, quiet=2, optimize=[0, 1], force=True,
+                       hardlink_dupes=True, journal=journal)
+    journal.compact()
+    for path in tree.rglob('*.py'):
+        for pyc in pycs(path):
+            os.utime(pyc, ns=(0, 0))
+    changed = tree / 'pkg' / 'mod.py'
+    changed.write_text('x = 2\n')
+    removed, = pycs(tree / 'pkg' / '__init__.py', [1])
+    os.unlink(removed)
+
+    profile = []
+    assert compile_dir(tree, quiet=2, optimize=[0, 1], force=True,
+                       hardlink_dupes=True, journal=PycJournal(journal.path),
+                       profile=profile)
+    statuses = {os.path.relpath(record['path'], tree): record['status']
+                for record in profile}
+    assert statuses == {'pkg/__init__.py': 'compiled', 'pkg/mod.py': 'compiled',
+                        'pkg/sub/same.py': 'up-to-date'}
+    assert mtimes(tree / 'pkg' / 'sub' / 'same.py') == [0, 0]
+    assert 0 not in mtimes(changed)
+    assert os.path.exists(removed)
+
+    # Different flags
+    assert compile_dir(tree, quiet=2, optimize=[0, 1], force=True,
+                       journal=PycJournal(journal.path))
+    assert 0 not in mtimes(tree / 'pkg' / 'sub' / 'same.py')
+
+
+def test_main_journal(tree, tmp_path, monkeypatch):
+    journal_path = tmp_path / 'journal'
+    argv = ['compileall2', '-q', '-f', '-j', '2', '-o', '0', '-o', '1',
+            '--journal', str(journal_path), str(tree / 'pkg')]
+    monkeypatch.setattr('sys.argv', argv)
+    assert compileall2.main()
+    with open(journal_path) as f:
+        assert len(f.readlines()) == 3
+    for path in tree.rglob('*.py'):
+        for pyc in pycs(path):
+            os.utime(pyc, ns=(0, 0))
+    assert compileall2.main()
+    for path in tree.rglob('*.py'):
+        assert mtimes(path) == [0, 0]
+
+
+def wait_for(path, timeout=30):
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        assert time.monotonic() < deadline, f'{path} not created in time'
+        time.sleep(0.01)
+
+
+@pytest.mark.parametrize('workers', ['1', '2'])
+def test_file_list_from_stdin_is_streamed(tree, workers):
+    first = tree / 'pkg' / 'mod.py'
+    second = tree / 'pkg' / 'sub' / 'same.py'
+    env = dict(os.environ,
+               PYTHONPATH=os.path.dirname(os.path.abspath(compileall2.__file__)))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'compileall2', '-q', '-j', workers, '-o', '0',
+         '-i', '-'],
+        stdin=subprocess.PIPE, env=env, universal_newlines=True)
+    try:
+        process.stdin.write(f'{first}\n\n')
+        process.stdin.flush()
+        # The first file is compiled while the list is still being written
+        pyc, = pycs(first, [0])
+        wait_for(pyc)
+        process.stdin.write(f'{second}\n{tree / "pkg" / "missing.py"}\n')
+        process.stdin.close()
+        assert process.wait(timeout=30) == 0
+    finally:
+        process.kill()
+    pyc, = pycs(second, [0])
+    assert os.path.exists(pyc)
+    pyc, = pycs(tree / 'pkg' / '__init__.py', [0])
+    assert not os.path.exists(pyc)
+
+
+@pytest.mark.parametrize('workers', ['1', '2'])
+def test_file_list_from_stdin_results_are_streamed(tree, workers):
+    first = tree / 'pkg' / 'mod.py'
+    env = dict(os.environ, PYTHONUNBUFFERED='1',
+               PYTHONPATH=os.path.dirname(os.path.abspath(compileall2.__file__)))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'compileall2', '-j', workers, '-o', '0',
+         '-i', '-'],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env,
+        universal_newlines=True)
+    try:
+        process.stdin.write(f'{first}\n')
+        process.stdin.flush()
+        # The result is printed while stdin is still open
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            line = executor.submit(process.stdout.readline)
+            try:
+                assert line.result(timeout=30) == f'Compiling {str(first)!r}...\n'
+            finally:
+                process.stdin.close()
+        assert process.wait(timeout=30) == 0
+    finally:
+        process.kill()
+        process.stdout.close()
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_compile_many(tree, workers, capsys):
+    (tree / 'pkg' / 'broken.py').write_text('def\n')
+    mod = tree / 'pkg' / 'mod.py'
+    assert compile_file(mod, quiet=2, optimize=[0, 1])
+    sources = [tree / 'pkg' / name for name in ('__init__.py', 'broken.py',
+                                                'mod.py', 'data.txt')]
+    results = {os.path.basename(result.path): result
+               for result in compile_many(sources, optimize=[0, 1],
+                                          hardlink_dupes=True,
+                                          workers=workers)}
+    assert capsys.readouterr().out == ''
+    assert {name: result.status for name, result in results.items()} == {
+        '__init__.py': 'compiled', 'broken.py': 'failed',
+        'mod.py': 'up-to-date', 'data.txt': 'excluded',
+    }
+    init = results['__init__.py']
+    assert init.success
+    assert init.written == list(pycs(tree / 'pkg' / '__init__.py', [0]))
+    assert init.linked == list(pycs(tree / 'pkg' / '__init__.py', [1]))
+    assert sorted(init.levels) == [0, 1]
+    assert init.wall > 0
+    broken = results['broken.py']
+    assert not broken.success
+    assert broken.error.startswith('  File')
+    assert 'SyntaxError' in broken.error
+    assert broken.written == []
+    assert results['mod.py'].kept == sorted(pycs(mod))
+    assert results['mod.py'].written == []
+    assert results['data.txt'].success
+
+
+def test_compile_many_identical_levels_without_hardlinks(tree):
+    # Levels 0 and 1 have the same content, both are written
+    path = tree / 'pkg' / 'sub' / 'same.py'
+    result, = compile_many([path], optimize=[0, 1])
+    assert result.written == list(pycs(path))
+    assert result.linked == []
+    assert len({os.stat(pyc).st_ino for pyc in pycs(path)}) == 2
+
+
+def test_compile_file_output(tree, capsys):
+    (tree / 'pkg' / 'broken.py').write_text('def\n')
+    assert compile_file(tree / 'pkg' / 'mod.py', quiet=0, optimize=[0])
+    assert capsys.readouterr().out == "Compiling {!r}...\n".format(
+        str(tree / 'pkg' / 'mod.py'))
+    assert not compile_file(tree / 'pkg' / 'broken.py', quiet=1, optimize=[0],
+                            stripdir='/nonexistent')
+    out = capsys.readouterr().out.splitlines()
+    assert out[0].startswith("The stripdir path '/nonexistent' is not")
+    assert out[1] == "*** Error compiling {!r}...".format(
+        str(tree / 'pkg' / 'broken.py'))
+    assert 'SyntaxError' in out[-2] or 'SyntaxError' in out[-1]
+
+
+@pytest.mark.parametrize('gil_enabled, expected', [
+    (True, ProcessPoolExecutor),
+    (False, ThreadPoolExecutor),
+])
+def test_auto_backend(monkeypatch, gil_enabled, expected):
+    monkeypatch.setattr('sys._is_gil_enabled', lambda: gil_enabled,
+                        raising=False)
+    with compileall2._pool(2) as executor:
+        assert isinstance(executor, expected)
+    assert compileall2._pool(1) is None
+    with pytest.raises(ValueError):
+        compileall2._pool(2, 'fork')
+
+
+def pyc_contents(tree):
+    contents = {}
+    for path in tree.rglob('*.py'):
+        for pyc in pycs(path, (0, 1, 2)):
+            with open(pyc, 'rb') as f:
+                contents[pyc] = f.read()
+    return contents
+
+
+@pytest.mark.parametrize('backend', ['process', 'thread'])
+def test_backends_same_as_serial(tree, tmp_path, backend):
+    for i in range(20):
+        (tree / 'pkg' / f'gen{i}.py').write_text('"""Doc."""\n' * (i % 2) +
+                                                 'assert x\n' * (i % 3 == 0))
+    cache = PycCache(tmp_path / 'cache')
+    assert compile_dir(tree, quiet=2, optimize=[0, 1, 2], workers=4,
+                       backend=backend, hardlink_dupes=True, cache=cache)
+    parallel = pyc_contents(tree), inode_layout(tree)
+    assert compile_dir(tree, quiet=2, optimize=[0, 1, 2], force=True,
+                       hardlink_dupes=True)
+    assert parallel == (pyc_contents(tree), inode_layout(tree))
+
+
+HAVE_INTERPRETERS = hasattr(concurrent.futures, 'InterpreterPoolExecutor')
+
+
+@pytest.mark.skipif(not HAVE_INTERPRETERS, reason='needs Python 3.14+')
+def test_interpreter_backend_same_as_serial(tree, tmp_path):
+    test_backends_same_as_serial(tree, tmp_path, 'interpreter')
+
+
+@pytest.mark.skipif(not HAVE_INTERPRETERS, reason='needs Python 3.14+')
+def test_interpreter_backend_as_script(tree):
+    # The subinterpreters cannot import the functions from __main__
+    env = dict(os.environ,
+               PYTHONPATH=os.path.dirname(os.path.abspath(compileall2.__file__)))
+    subprocess.run([sys.executable, '-m', 'compileall2', '-q', '-j', '2',
+                    '--backend', 'interpreter', '-o', '0', '-o', '1',
+                    str(tree / 'pkg')], env=env, check=True)
+    for path in tree.rglob('*.py'):
+        for pyc in pycs(path):
+            assert os.path.exists(pyc)
+
+
+def test_shareable_keeps_functions_for_other_executors(monkeypatch):
+    monkeypatch.setattr(compileall2, '__name__', '__main__')
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        function = compileall2._shareable(executor, compileall2._call_chunk)
+    assert function is compileall2._call_chunk
+
+
+@pytest.mark.skipif(HAVE_INTERPRETERS, reason='needs Python < 3.14')
+def test_interpreter_backend_unavailable(tree, monkeypatch, capsys):
+    with pytest.raises(ValueError):
+        compileall2._pool(2, 'interpreter')
+    monkeypatch.setattr('sys.argv', [
+        'compileall2', '-q', '-j', '2', '--backend', 'interpreter',
+        str(tree / 'pkg'),
+    ])
+    with pytest.raises(SystemExit):
+        compileall2.main()
+    assert 'Python 3.14+' in capsys.readouterr().err
+
+
+# Worker processes would not start with the patched sys.path
+@pytest.mark.parametrize('workers', [1, 2])
+def test_compile_path_continues_after_failure(tmp_path, monkeypatch, capsys,
+                                              workers):
+    dirs = [tmp_path / name for name in ('first', 'second')]
+    for dir in dirs:
+        dir.mkdir()
+    (dirs[0] / 'broken.py').write_text('def\n')
+    (dirs[1] / 'good.py').write_text('x = 1\n')
+    (dirs[1] / 'pkg').mkdir()
+    (dirs[1] / 'pkg' / 'deep.py').write_text('x = 1\n')
+    monkeypatch.setattr('sys.path', ['', str(dirs[0]), str(dirs[1]),
+                                     str(dirs[1])])
+    assert not compileall2.compile_path(quiet=1, optimize=[0],
+                                        workers=workers, backend='thread')
+    out = capsys.readouterr().out
+    assert 'Skipping current directory' in out
+    assert out.count('Error compiling') == 1
+    pyc, = pycs(dirs[1] / 'good.py', [0])
+    assert os.path.exists(pyc)
+    # maxlevels=0 by default
+    pyc, = pycs(dirs[1] / 'pkg' / 'deep.py', [0])
+    assert not os.path.exists(pyc)
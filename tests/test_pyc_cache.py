@@ -0,0 +1,81 @@
+from pyc_cache import PycCache, parse_size
+
+import os
+import py_compile
+import sys
+
+import pytest
+
+
+TIMESTAMP = py_compile.PycInvalidationMode.TIMESTAMP
+
+
+@pytest.mark.parametrize('size, expected', [
+    ('123', 123),
+    (123, 123),
+    ('1K', 1024),
+    ('500M', 500 * 1024 ** 2),
+    ('2G', 2 * 1024 ** 3),
+    ('2GiB', 2 * 1024 ** 3),
+])
+def test_parse_size(size, expected):
+    assert parse_size(size) == expected
+
+
+@pytest.mark.parametrize('size', ['', 'G', '1T', '-1'])
+def test_parse_size_invalid(size):
+    with pytest.raises(ValueError):
+        parse_size(size)
+
+
+def test_key_depends_on_all_inputs(tmp_path):
+    cache = PycCache(tmp_path)
+    key = cache.key(b'x = 1', 0, '/usr/lib/x.py', TIMESTAMP)
+    assert key == cache.key(b'x = 1', 0, '/usr/lib/x.py', TIMESTAMP)
+    assert key != cache.key(b'x = 2', 0, '/usr/lib/x.py', TIMESTAMP)
+    assert key != cache.key(b'x = 1', 1, '/usr/lib/x.py', TIMESTAMP)
+    assert key != cache.key(b'x = 1', 0, '/usr/lib/y.py', TIMESTAMP)
+    assert key != cache.key(b'x = 1', 0, '/usr/lib/x.py',
+                            py_compile.PycInvalidationMode.CHECKED_HASH)
+
+
+def test_key_depends_on_interpreter_build(tmp_path, monkeypatch):
+    # Patch releases keep the magic number
+    cache = PycCache(tmp_path)
+    key = cache.key(b'x = 1', 0, '/usr/lib/x.py', TIMESTAMP)
+    monkeypatch.setattr('sys.version', sys.version + ' (rebuilt)')
+    assert key != cache.key(b'x = 1', 0, '/usr/lib/x.py', TIMESTAMP)
+
+
+def test_get_put(tmp_path):
+    cache = PycCache(tmp_path / 'cache')
+    key = cache.key(b'x = 1', 0, 'x.py', TIMESTAMP)
+    assert cache.get(key) is None
+    cache.put(key, b'payload')
+    assert cache.get(key) == b'payload'
+
+
+def test_damaged_entry_is_a_miss(tmp_path):
+    cache = PycCache(tmp_path)
+    key = cache.key(b'x = 1', 0, 'x.py', TIMESTAMP)
+    cache.put(key, b'payload')
+    path = cache._path(key)
+    with open(path, 'r+b') as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(b'X')
+    assert cache.get(key) is None
+    assert not os.path.exists(path)
+
+
+def test_evict_least_recently_used(tmp_path):
+    cache = PycCache(tmp_path, max_size=1000)
+    keys = [cache.key(str(i).encode(), 0, 'x.py', TIMESTAMP) for i in range(6)]
+    for age, key in enumerate(keys):
+        cache.put(key, b'x' * 200)
+        os.utime(cache._path(key), (age, age))
+    # Using an old entry makes it recent
+    assert cache.get(keys[0]) is not None
+    assert cache.evict() == 3
+    assert [cache.get(key) is not None for key in keys] == [
+        True, False, False, False, True, True]
+    assert cache.evict() == 0
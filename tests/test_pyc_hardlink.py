@@ -0,0 +1,70 @@
+from pyc_hardlink import find_pycs, link_identical, sibling_groups
+
+import os
+
+import pytest
+
+
+@pytest.fixture
+def pycache(tmp_path):
+    pycache = tmp_path / 'pkg' / '__pycache__'
+    pycache.mkdir(parents=True)
+    for name in 'a.cpython-312.pyc', 'a.cpython-312.opt-1.pyc':
+        (pycache / name).write_bytes(b'same')
+    (pycache / 'a.cpython-312.opt-2.pyc').write_bytes(b'diff')
+    (pycache / 'b.cpython-312.pyc').write_bytes(b'same')
+    (pycache / 'c.cpython-312.pyc').write_bytes(b'c')
+    (pycache / 'c.cpython-312.opt-1.pyc').symlink_to('c.cpython-312.pyc')
+    (tmp_path / 'pkg' / 'd.pyc').write_bytes(b'py2')
+    (tmp_path / 'pkg' / 'd.pyo').write_bytes(b'py2')
+    return pycache
+
+
+def test_sibling_groups(pycache):
+    groups = sibling_groups(find_pycs(str(pycache.parent)))
+    assert groups == [
+        [str(pycache / 'a.cpython-312.opt-1.pyc'),
+         str(pycache / 'a.cpython-312.opt-2.pyc'),
+         str(pycache / 'a.cpython-312.pyc')],
+        [str(pycache.parent / 'd.pyc'), str(pycache.parent / 'd.pyo')],
+    ]
+
+
+def test_link_identical(pycache):
+    group = [str(path) for path in sorted(pycache.glob('a.*'))]
+    assert link_identical(group) == (1, 4)
+    a = pycache / 'a.cpython-312.pyc'
+    assert a.stat().st_ino == (pycache / 'a.cpython-312.opt-1.pyc').stat().st_ino
+    assert a.stat().st_nlink == 2
+    assert (pycache / 'a.cpython-312.opt-2.pyc').stat().st_nlink == 1
+    # Already linked files are not linked again
+    assert link_identical(group) == (0, 0)
+
+
+def test_link_identical_same_digest_only(pycache, tmp_path):
+    # Files of the same size with a different content are not linked
+    other = tmp_path / 'other.pyc'
+    other.write_bytes(b'diff')
+    assert link_identical([str(pycache / 'a.cpython-312.pyc'),
+                           str(other)]) == (0, 0)
+
+
+def test_link_identical_keeps_other_links(pycache, tmp_path):
+    # A copy that has a name outside of the group is linked, but not freed
+    b = pycache / 'b.cpython-312.pyc'
+    os.link(b, tmp_path / 'elsewhere.pyc')
+    assert link_identical([str(pycache / 'a.cpython-312.pyc'),
+                           str(b)]) == (1, 0)
+    assert b.stat().st_nlink == 2
+
+
+def test_main_tree(pycache, monkeypatch, capsys):
+    import pyc_hardlink
+    tree = str(pycache.parent)
+    monkeypatch.setattr('sys.argv', ['pyc_hardlink', '--tree', tree, tree])
+    assert pyc_hardlink.main()
+    # b is a copy of a from a different module, d.pyo of d.pyc
+    assert ((pycache / 'a.cpython-312.pyc').stat().st_ino ==
+            (pycache / 'b.cpython-312.pyc').stat().st_ino)
+    assert (pycache / 'a.cpython-312.pyc').stat().st_nlink == 3
+    assert 'Hardlinked 3 identical pyc files, saved 11 bytes' in capsys.readouterr().out
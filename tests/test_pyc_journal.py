@@ -0,0 +1,87 @@
+from pyc_journal import PycJournal
+
+import os
+import pickle
+
+import pytest
+
+
+FLAGS = {'optimize': [0, 1]}
+
+
+@pytest.fixture
+def compiled(tmp_path):
+    """A journal entry of x.py with two pyc files"""
+    cfiles = {str(tmp_path / 'x.pyc'): b'pyc0', str(tmp_path / 'x.1.pyc'): b'pyc1'}
+    for cfile, data in cfiles.items():
+        with open(cfile, 'wb') as f:
+            f.write(data)
+    journal = PycJournal(tmp_path / 'journal')
+    journal.record(PycJournal.entry('x.py', b'x = 1', FLAGS, cfiles, [1, 5]))
+    journal.close()
+    return PycJournal(tmp_path / 'journal'), list(cfiles)
+
+
+def test_is_current(compiled):
+    journal, cfiles = compiled
+    assert journal.is_current('x.py', b'x = 1', FLAGS, cfiles, [1, 5])
+
+
+@pytest.mark.parametrize('source, source_bytes, flags, stamp', [
+    ('y.py', b'x = 1', FLAGS, [1, 5]),
+    ('x.py', b'x = 2', FLAGS, [1, 5]),
+    ('x.py', b'x = 1', {'optimize': [0]}, [1, 5]),
+    ('x.py', b'x = 1', FLAGS, [2, 5]),
+])
+def test_is_not_current_with_different_inputs(compiled, source, source_bytes,
+                                              flags, stamp):
+    journal, cfiles = compiled
+    assert not journal.is_current(source, source_bytes, flags, cfiles, stamp)
+
+
+def test_is_not_current_with_different_outputs(compiled):
+    journal, cfiles = compiled
+    assert not journal.is_current('x.py', b'x = 1', FLAGS, cfiles[:1], [1, 5])
+    with open(cfiles[1], 'wb') as f:
+        f.write(b'changed')
+    assert not journal.is_current('x.py', b'x = 1', FLAGS, cfiles, [1, 5])
+    os.unlink(cfiles[1])
+    assert not journal.is_current('x.py', b'x = 1', FLAGS, cfiles, [1, 5])
+
+
+def test_same_inodes(tmp_path):
+    cfiles = {str(tmp_path / 'x.pyc'): b'pyc', str(tmp_path / 'x.1.pyc'): b'pyc'}
+    for cfile, data in cfiles.items():
+        with open(cfile, 'wb') as f:
+            f.write(data)
+    journal = PycJournal(tmp_path / 'journal')
+    journal.record(PycJournal.entry('x.py', b'x = 1', FLAGS, cfiles))
+    assert not journal.is_current('x.py', b'x = 1', FLAGS, cfiles,
+                                  same_inodes=True)
+    pyc0, pyc1 = cfiles
+    os.unlink(pyc1)
+    os.link(pyc0, pyc1)
+    assert journal.is_current('x.py', b'x = 1', FLAGS, cfiles,
+                              same_inodes=True)
+
+
+def test_compact_keeps_last_entries(tmp_path):
+    path = tmp_path / 'journal'
+    journal = PycJournal(path)
+    for i in range(3):
+        for name in 'a.py', 'b.py':
+            journal.record(PycJournal.entry(name, str(i).encode(), FLAGS, {}))
+    with open(path, 'ab') as f:
+        f.write(b'{"damaged')
+    journal.compact()
+    with open(path) as f:
+        assert len(f.readlines()) == 2
+    assert PycJournal(path).is_current('a.py', b'2', FLAGS, [])
+    assert not PycJournal(path).is_current('a.py', b'1', FLAGS, [])
+
+
+def test_unpickled_once_per_process(tmp_path):
+    journal = PycJournal(tmp_path / 'journal')
+    first = pickle.loads(pickle.dumps(journal))
+    assert first is not journal
+    assert pickle.loads(pickle.dumps(journal)) is first
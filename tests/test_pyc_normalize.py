@@ -0,0 +1,105 @@
+from pyc_normalize import (needs_normalization, normalize, normalize_file,
+                           normalize_pyc)
+
+import importlib.util
+import marshal
+import py_compile
+
+import pytest
+
+
+def test_normalize_clears_unused_flag():
+    spam = ''.join(['sp', 'am'])
+    eggs = ''.join(['eg', 'gs'])
+    data = marshal.dumps([spam, eggs, eggs])
+    # Both strings are flagged, only eggs is referenced
+    assert data.count(b'r') == 1
+    normalized = normalize(data)
+    assert len(normalized) == len(data)
+    assert normalized != data
+    assert marshal.loads(normalized) == [spam, eggs, eggs]
+    # The reference to eggs is renumbered from 1 to 0
+    assert normalized.endswith(b'r\x00\x00\x00\x00')
+    assert normalize(normalized) is normalized
+
+
+def test_normalize_unchanged():
+    spam = ''.join(['sp', 'am'])
+    data = marshal.dumps([spam, spam])
+    assert normalize(data) is data
+
+
+def test_normalize_code():
+    code = compile('def f(a, b=1):\n    return a + b\nx = f(1)\n', 'mod.py',
+                   'exec')
+    data = marshal.dumps(code)
+    normalized = normalize(data)
+    assert marshal.loads(normalized) == code
+    assert normalize(normalized) is normalized
+
+
+@pytest.mark.parametrize('data', [b'', b'[\x02\x00\x00\x00z\x01a',
+                                  b'r\x00\x00\x00\x00', b'?'])
+def test_normalize_invalid(data):
+    with pytest.raises(ValueError):
+        normalize(data)
+
+
+def test_normalize_unsupported_magic():
+    # Python 2.7
+    with pytest.raises(ValueError, match='unsupported magic number'):
+        normalize(b'N', magic=b'\x03\xf3\r\n')
+
+
+def test_normalize_file(tmp_path):
+    source = tmp_path / 'mod.py'
+    source.write_text('"""Doc"""\nimport os\n\ndef f(x):\n    return os.sep + x\n')
+    pyc = py_compile.compile(str(source), cfile=str(tmp_path / 'mod.pyc'),
+                             doraise=True)
+    with open(pyc, 'rb') as f:
+        data = f.read()
+    changed = normalize_file(pyc)
+    with open(pyc, 'rb') as f:
+        normalized = f.read()
+    assert changed == (normalized != data)
+    assert normalized == normalize_pyc(data)
+    assert normalized[:4] == importlib.util.MAGIC_NUMBER
+    assert not normalize_file(pyc)
+
+
+def write_pyc(path, data):
+    path.write_bytes(importlib.util.MAGIC_NUMBER + bytes(12) + data)
+    return str(path)
+
+
+def test_needs_normalization(tmp_path):
+    spam = ''.join(['sp', 'am'])
+    pyc = write_pyc(tmp_path / 'spam.pyc', marshal.dumps([spam]))
+    assert needs_normalization(pyc)
+    assert normalize_file(pyc)
+    assert not needs_normalization(pyc)
+    assert not normalize_file(pyc)
+
+
+@pytest.mark.parametrize('data', [b'', importlib.util.MAGIC_NUMBER,
+                                  importlib.util.MAGIC_NUMBER + bytes(12)])
+def test_needs_normalization_invalid(tmp_path, data):
+    pyc = tmp_path / 'invalid.pyc'
+    pyc.write_bytes(data)
+    with pytest.raises(ValueError):
+        needs_normalization(str(pyc))
+
+
+def test_main_check(tmp_path, monkeypatch, capsys):
+    import pyc_normalize
+    spam = ''.join(['sp', 'am'])
+    flagged = write_pyc(tmp_path / 'flagged.pyc', marshal.dumps([spam]))
+    clean = write_pyc(tmp_path / 'clean.pyc', marshal.dumps([spam, spam]))
+    monkeypatch.setattr('sys.argv', ['pyc_normalize', '--check', flagged,
+                                     clean])
+    with open(flagged, 'rb') as f:
+        data = f.read()
+    assert pyc_normalize.main()
+    assert capsys.readouterr().out == flagged + '\0'
+    with open(flagged, 'rb') as f:
+        assert f.read() == data
@@ -0,0 +1,90 @@
+from python_install_post import (_brp_number, bytecompile, hardlink,
+                                 rpm_in_distinfo, scan_buildroot)
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+PYTHON = 'python{0.major}.{0.minor}'.format(sys.version_info)
+
+
+@pytest.fixture
+def buildroot(tmp_path):
+    libdir = tmp_path / 'usr' / 'lib' / PYTHON
+    distinfo = libdir / 'site-packages' / 'foo-1.dist-info'
+    distinfo.mkdir(parents=True)
+    (distinfo / 'INSTALLER').write_text('pip\n')
+    (distinfo / 'RECORD').write_text('foo/__init__.py,,\n')
+    (libdir / 'site-packages' / 'foo').mkdir()
+    (libdir / 'site-packages' / 'foo' / '__init__.py').write_text('x = 1\n')
+    pycache = tmp_path / 'usr' / 'share' / 'foo' / '__pycache__'
+    pycache.mkdir(parents=True)
+    for name in 'a.pyc', 'a.opt-1.pyc', 'a.opt-2.pyc':
+        (pycache / name).write_bytes(b'pyc')
+    (pycache / 'b.pyc').write_bytes(b'pyc')
+    (pycache / 'b.opt-1.pyc').write_bytes(b'other')
+    (tmp_path / 'usr' / 'lib64' / 'python3').mkdir(parents=True)
+    return tmp_path
+
+
+def test_scan_buildroot(buildroot):
+    scan = scan_buildroot(str(buildroot))
+    assert scan.libdirs == [str(buildroot / 'usr' / 'lib' / PYTHON)]
+    assert scan.installers == [str(buildroot / 'usr' / 'lib' / PYTHON /
+                                   'site-packages' / 'foo-1.dist-info' /
+                                   'INSTALLER')]
+    assert len(scan.pycs) == 5
+
+
+@pytest.mark.parametrize('value', ['', '0', '00', '1', '01', ' 0', ' 1',
+                                   '1 ', '010', '08', '9', 'yes', '0x10'])
+def test_brp_number_same_as_bash(value):
+    # brp-python-bytecompile tests [[ 0"$errors_terminate" -ne 0 ]]
+    process = subprocess.run(['bash', '-c', '[[ 0"$1" -ne 0 ]] 2>/dev/null',
+                              'bash', value])
+    assert (_brp_number(value) not in (None, 0)) == (process.returncode == 0)
+
+
+def test_rpm_in_distinfo(buildroot):
+    scan = scan_buildroot(str(buildroot))
+    assert rpm_in_distinfo(scan)
+    installer, = scan.installers
+    assert open(installer).read() == 'rpm\n'
+    assert not os.path.exists(os.path.join(os.path.dirname(installer),
+                                           'RECORD'))
+
+
+def test_hardlink(buildroot):
+    assert hardlink(scan_buildroot(str(buildroot)))
+    pycache = buildroot / 'usr' / 'share' / 'foo' / '__pycache__'
+    assert len({(pycache / name).stat().st_ino
+                for name in ('a.pyc', 'a.opt-1.pyc', 'a.opt-2.pyc')}) == 1
+    assert (pycache / 'b.pyc').stat().st_nlink == 1
+
+
+def test_bytecompile_adds_pycs(buildroot, tmp_path_factory, monkeypatch):
+    # The interpreter of the libdir is found by its name, like in the BRP
+    bindir = tmp_path_factory.mktemp('bin')
+    (bindir / PYTHON).symlink_to(sys.executable)
+    monkeypatch.setenv('PATH', '{}:{}'.format(bindir, os.environ['PATH']))
+    monkeypatch.setenv('PYTHON_PROBE_CACHE_DIR',
+                       str(tmp_path_factory.mktemp('probe')))
+    scan = scan_buildroot(str(buildroot))
+    assert bytecompile(scan, compileall_flags=['-j2'])
+    pycache = (buildroot / 'usr' / 'lib' / PYTHON / 'site-packages' / 'foo' /
+               '__pycache__')
+    pycs = {str(path) for path in pycache.iterdir()}
+    assert len(pycs) == 2
+    assert pycs <= scan.pycs
+    assert scan.pycs == scan_buildroot(str(buildroot)).pycs
+
+
+def test_hardlink_tree(buildroot):
+    pycache = buildroot / 'usr' / 'share' / 'foo' / '__pycache__'
+    (pycache / 'c.pyc').write_bytes(b'pyc')
+    assert hardlink(scan_buildroot(str(buildroot)), tree=str(pycache))
+    assert (pycache / 'a.pyc').stat().st_nlink == 5
+    assert (pycache / 'b.opt-1.pyc').stat().st_nlink == 1
@@ -0,0 +1,68 @@
+from pathlib import Path
+
+import importlib.util
+import subprocess
+import sys
+
+import pytest
+
+SCRIPT_PATH = Path("/usr/lib/rpm/redhat/python-probe")
+
+
+def probe(cache_dir, *args):
+    return subprocess.run(
+        [SCRIPT_PATH, sys.executable, *args],
+        env={"PATH": "/usr/bin:/bin", "PYTHON_PROBE_CACHE_DIR": str(cache_dir)},
+        capture_output=True, text=True,
+    )
+
+
+def test_fields(tmp_path):
+    result = probe(tmp_path)
+    assert result.returncode == 0
+    fields = dict(line.split("=", 1) for line in result.stdout.splitlines())
+    assert fields["version"] == "{0.major}{0.minor}".format(sys.version_info)
+    assert fields["magic"] == importlib.util.MAGIC_NUMBER.hex()
+    assert fields["cache_tag"] == sys.implementation.cache_tag
+    assert "workers" in fields["compileall_arguments"].split()
+
+
+def test_cache_is_used(tmp_path):
+    assert probe(tmp_path, "version").returncode == 0
+    cache_file, = tmp_path.iterdir()
+    cache_file.write_text("version=1\n")
+    result = probe(tmp_path, "version")
+    assert result.returncode == 0
+    assert result.stdout == "1\n"
+
+
+def test_compileall_arguments_are_cached(tmp_path):
+    assert probe(tmp_path, "version").returncode == 0
+    cache_file, = tmp_path.iterdir()
+    cache_file.write_text("compileall_arguments=maxlevels ddir\n")
+    result = probe(tmp_path, "compileall_arguments")
+    assert result.returncode == 0
+    assert result.stdout == "maxlevels ddir\n"
+
+
+@pytest.mark.parametrize("mode", [0o777, 0o770])
+def test_unsafe_cache_dir_is_not_used(tmp_path, mode):
+    assert probe(tmp_path, "version").returncode == 0
+    cache_file, = tmp_path.iterdir()
+    cache_file.write_text("version=1\n")
+    tmp_path.chmod(mode)
+    result = probe(tmp_path, "version")
+    assert result.returncode == 0
+    assert result.stdout == "{0.major}{0.minor}\n".format(sys.version_info)
+
+
+def test_cache_dir_is_private(tmp_path):
+    cache_dir = tmp_path / "cache"
+    assert probe(cache_dir, "version").returncode == 0
+    assert cache_dir.stat().st_mode & 0o777 == 0o700
+
+
+@pytest.mark.parametrize("args", [("bogus",), ("a", "b", "c")])
+def test_errors(tmp_path, args):
+    result = subprocess.run([SCRIPT_PATH, *args], capture_output=True, text=True)
+    assert result.returncode != 0
@@ -23,13 +23,15 @@ testdata = [
     ("usr/lib64/python3.13/site-packages/setuptools/_vendor/zipp-3.19.2.dist-info/", "pip\n", "pip\n", True),
     ("usr/lib/python3.13/site-packages/zipp-3.19.2.dist-info/","not pip in INSTALLER\n", "not pip in INSTALLER\n", True),
     ("usr/lib64/python3.13/site-packages/zipp-3.19.2.dist-info/","not pip in INSTALLER\n", "not pip in INSTALLER\n", True),
+    ("app/lib/python3.13/site-packages/zipp-3.19.2.dist-info/", "pip\n", "pip\n", True),
+    ("usr/share/python3.13/site-packages/zipp-3.19.2.dist-info/", "pip\n", "pip\n", True),
 ]
 @pytest.mark.parametrize("path, installer_content, expected_installer_content, record_file_exists", testdata)
-def test_installer_file_was_correctly_modified(monkeypatch, create_test_files,
+def test_installer_file_was_correctly_modified(monkeypatch, tmp_path, create_test_files,
 path, installer_content, expected_installer_content, record_file_exists):
     script_path = Path("/usr/lib/rpm/redhat/brp-python-rpm-in-distinfo")
     tmp_dir = create_test_files(path, installer_content)
-    monkeypatch.setenv("RPM_BUILD_ROOT", str(tmp_dir))
+    monkeypatch.setenv("RPM_BUILD_ROOT", str(tmp_path))
     result = subprocess.run(
         [script_path],
         capture_output=True, text=True
@@ -0,0 +1,77 @@
+from scan_py_sources import SourceFile, scan_dir, source_file
+
+import os
+import pickle
+
+import pytest
+
+
+@pytest.fixture
+def tree(tmp_path):
+    (tmp_path / 'pkg' / 'sub').mkdir(parents=True)
+    (tmp_path / 'pkg' / '__pycache__').mkdir()
+    (tmp_path / 'pkg' / 'dir.py').mkdir()
+    (tmp_path / 'pkg' / '__init__.py').write_text('')
+    (tmp_path / 'pkg' / 'mod.py').write_text('x = 1\n')
+    (tmp_path / 'pkg' / 'data.txt').write_text('not python\n')
+    (tmp_path / 'pkg' / '__pycache__' / 'cached.py').write_text('')
+    (tmp_path / 'pkg' / 'dir.py' / 'inner.py').write_text('')
+    (tmp_path / 'pkg' / 'sub' / 'deep.py').write_text('y = 2\n')
+    (tmp_path / 'pkg' / 'link.py').symlink_to(tmp_path / 'pkg' / 'mod.py')
+    (tmp_path / 'pkg' / 'dangling.py').symlink_to(tmp_path / 'missing.py')
+    (tmp_path / 'pkg' / 'sublink').symlink_to(tmp_path / 'pkg' / 'sub')
+    return tmp_path
+
+
+def test_scan_dir_yields_only_py_files(tree):
+    found = [s.path for s in scan_dir(tree, maxlevels=10, quiet=2)]
+    assert found == [
+        str(tree / 'pkg' / '__init__.py'),
+        str(tree / 'pkg' / 'dangling.py'),
+        str(tree / 'pkg' / 'dir.py' / 'inner.py'),
+        str(tree / 'pkg' / 'link.py'),
+        str(tree / 'pkg' / 'mod.py'),
+        str(tree / 'pkg' / 'sub' / 'deep.py'),
+    ]
+
+
+def test_scan_dir_maxlevels(tree):
+    assert list(scan_dir(tree, maxlevels=0, quiet=2)) == []
+    found = [s.name for s in scan_dir(tree / 'pkg', maxlevels=0, quiet=2)]
+    assert found == ['__init__.py', 'dangling.py', 'link.py', 'mod.py']
+
+
+def test_scan_dir_stat_data(tree):
+    sources = {s.name: s for s in scan_dir(tree, maxlevels=10, quiet=2)}
+    mod = sources['mod.py']
+    assert mod.is_file() and not mod.is_symlink
+    assert mod.st.st_ino == os.stat(mod.path).st_ino
+    link = sources['link.py']
+    assert link.is_file() and link.is_symlink
+    assert link.st.st_ino == mod.st.st_ino
+    dangling = sources['dangling.py']
+    assert dangling.st is None and dangling.is_symlink
+    assert not dangling.is_file()
+
+
+def test_scan_dir_unlistable(tmp_path, capsys):
+    assert list(scan_dir(tmp_path / 'missing', maxlevels=10, quiet=1)) == []
+    assert "Can't list" in capsys.readouterr().out
+
+
+def test_source_file_matches_scan(tree):
+    for scanned in scan_dir(tree, maxlevels=10, quiet=2):
+        created = source_file(scanned.path)
+        assert created.name == scanned.name
+        assert created.is_symlink == scanned.is_symlink
+        assert created.is_file() == scanned.is_file()
+        assert source_file(scanned) is scanned
+
+
+def test_source_file_is_picklable(tree):
+    source = source_file(tree / 'pkg' / 'mod.py')
+    assert isinstance(source, SourceFile)
+    assert os.fspath(source) == str(tree / 'pkg' / 'mod.py')
+    copy = pickle.loads(pickle.dumps(source))
+    assert (copy.path, copy.name, copy.st, copy.is_symlink) == (
+        source.path, source.name, source.st, source.is_symlink)